@@ -1,25 +1,125 @@
+import argparse
+import asyncio
+import atexit
+import bisect
+import cProfile
+import gzip
+import hashlib
+import heapq
 import html
+import io
 import json
 import os
+import queue
+import random
 import re
 import secrets
+import selectors
+import shutil
+import signal
+import tempfile
+import socket
 import sqlite3
+import sys
+import threading
 import time
-from datetime import datetime
+import traceback
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from http import cookies
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from urllib.parse import parse_qs, unquote, urlparse
+from urllib.parse import parse_qs, parse_qsl, quote, unquote, urlencode, urlparse
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow only the uploaded file itself is served
+    Image = None
+
+try:
+    import markdown
+except ImportError:  # optional: `app.py import` falls back to a small built-in Markdown subset
+    markdown = None
 
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 UPLOADS_DIR = BASE_DIR / "uploads"
 STATIC_DIR = BASE_DIR / "static"
 DB_PATH = DATA_DIR / "blog.db"
-SESSIONS = {}
+SITEMAP_DIR = DATA_DIR / "sitemaps"
+CONTENT_STAMP = DATA_DIR / "content.stamp"
+TAXONOMY_STAMP = DATA_DIR / "taxonomy.stamp"
 APP_NAME = "Diario de Chino"
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 GA4_ID = os.getenv("GA4_ID", "")
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "12"))
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+RELATED_POSTS = int(os.getenv("RELATED_POSTS", "4"))
+FEED_SIZE = int(os.getenv("FEED_SIZE", "20"))
+SITEMAP_SHARD_SIZE = min(50000, int(os.getenv("SITEMAP_SHARD_SIZE", "10000")))
+CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+FTS_ENABLED = False
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+MIME_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".map": "application/json",
+    ".json": "application/json",
+    ".txt": "text/plain; charset=utf-8",
+    ".xml": "application/xml",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".ico": "image/x-icon",
+    ".woff2": "font/woff2",
+}
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+IMAGE_WIDTHS = [int(w) for w in os.getenv("IMAGE_WIDTHS", "480,800,1200").split(",") if w.strip()]
+IMAGE_SIZES = "(max-width: 860px) 100vw, 860px"
+IMAGE_WORKERS = ThreadPoolExecutor(max_workers=int(os.getenv("IMAGE_WORKERS", "2")), thread_name_prefix="image")
+IMAGE_TYPES = {b"RIFF": ".webp", b"\x89PNG": ".png", b"GIF8": ".gif", b"\xff\xd8\xff": ".jpg"}
+DERIVED_VERSION = 1  # bump when the stored post fragments change shape; `app.py derive` rewrites older rows
+ASSETS = {}  # static file name -> content-hashed name
+ASSET_FILES = {}  # content-hashed name -> static file name
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_MMAP_BYTES = int(os.getenv("DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+DB_CACHE_KIB = int(os.getenv("DB_CACHE_KIB", "32768"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "2"))
+ANALYTICS_RETENTION_DAYS = int(os.getenv("ANALYTICS_RETENTION_DAYS", "30"))
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90"))
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_CACHE_SECONDS = float(os.getenv("SESSION_CACHE_SECONDS", "10"))
+WORKERS = int(os.getenv("WORKERS", "1"))
+SERVER_ENGINE = os.getenv("SERVER_ENGINE", "threading")  # or "asyncio": keep-alive connections, bounded worker pool
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", str(DB_POOL_SIZE)))
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "15"))
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "32"))  # threading engine: fixed pool instead of a thread per connection
+ACCEPT_QUEUE = int(os.getenv("ACCEPT_QUEUE", "64"))  # connections (threading) or requests (asyncio) allowed to wait for a worker
+ADMIN_WORKERS = int(os.getenv("ADMIN_WORKERS", "2"))  # threading: workers public traffic can't take; asyncio: a separate admin pool
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "10"))  # whole request head; each body read
+WRITE_TIMEOUT = float(os.getenv("WRITE_TIMEOUT", "30"))  # each response write
+RETRY_AFTER = int(os.getenv("RETRY_AFTER", "5"))
+MAX_FORM_BYTES = int(os.getenv("MAX_FORM_BYTES", str(2 * 1024 * 1024)))
+BODY_LIMITS = {'/admin/save': MAX_FORM_BYTES, '/admin/upload-image': MAX_UPLOAD_BYTES}
+MAX_BODY_BYTES = 16 * 1024  # any other route (login, category/tag add)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0"))  # fraction of requests run under cProfile
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_DIR = DATA_DIR / "profiles"
 
 DEFAULT_CATEGORIES = [
     "Diario de aprendizaje",
@@ -32,82 +132,304 @@ DEFAULT_CATEGORIES = [
 
 def ensure_dirs():
     DATA_DIR.mkdir(exist_ok=True)
+    SITEMAP_DIR.mkdir(exist_ok=True)
     UPLOADS_DIR.mkdir(exist_ok=True)
     STATIC_DIR.mkdir(exist_ok=True)
 
 
-def db():
-    conn = sqlite3.connect(DB_PATH)
+def connect():
+    # Connections are long-lived, so sqlite3's per-connection statement cache keeps the hot queries prepared.
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_BYTES}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KIB}")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by the request threads."""
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            grow = self.created < self.size
+            if grow:
+                self.created += 1
+        if not grow:
+            try:
+                return self.idle.get(timeout=DB_POOL_TIMEOUT)
+            except queue.Empty:
+                raise sqlite3.OperationalError(f"no pooled connection freed within {DB_POOL_TIMEOUT:g}s") from None
+        try:
+            return connect()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self.idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self.lock:
+                self.created -= 1
+
+
+POOL = ConnectionPool(DB_POOL_SIZE)
+
+
+class RequestStats:
+    """Timings of the request being handled on this thread; db() charges SQL time and statements to it."""
+
+    __slots__ = ("started", "headers_at", "db", "queries", "status", "profiler")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.headers_at = None
+        self.db = 0.0
+        self.queries = 0
+        self.status = None
+        self.profiler = None
+
+
+REQUEST_STATS = threading.local()
+
+
+class MeteredCursor:
+    __slots__ = ("cursor", "stats")
+
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.stats.db += time.perf_counter() - started
+
+    def execute(self, sql, params=()):
+        self.stats.queries += 1
+        self.timed(self.cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, rows):
+        self.stats.queries += 1
+        self.timed(self.cursor.executemany, sql, rows)
+        return self
+
+    def fetchone(self):
+        return self.timed(self.cursor.fetchone)
+
+    def fetchall(self):
+        return self.timed(self.cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class MeteredConnection:
+    """Connection proxy used while a request is being timed; fetches count as DB time too."""
+
+    __slots__ = ("conn", "stats")
+
+    def __init__(self, conn, stats):
+        self.conn = conn
+        self.stats = stats
+
+    def cursor(self):
+        return MeteredCursor(self.conn.cursor(), self.stats)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.cursor().executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+@contextmanager
+def db():
+    conn = POOL.acquire()
+    stats = getattr(REQUEST_STATS, "current", None)
+    try:
+        yield MeteredConnection(conn, stats) if stats else conn
+        if conn.in_transaction:
+            started = time.perf_counter()
+            conn.commit()
+            if stats:
+                stats.db += time.perf_counter() - started
+    finally:
+        POOL.release(conn)
+
+
+# Applied in order on top of the base schema; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    """
+    CREATE INDEX IF NOT EXISTS idx_posts_status_published ON posts(status, published_at, id);
+    CREATE INDEX IF NOT EXISTS idx_posts_category_published ON posts(category_id, status, published_at, id);
+    CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON post_tags(tag_id, post_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS uploads (
+        sha256 TEXT PRIMARY KEY,
+        filename TEXT UNIQUE NOT NULL,
+        bytes INTEGER NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        variants TEXT NOT NULL DEFAULT '[]',
+        created_at TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE posts ADD COLUMN plain_text TEXT;
+    ALTER TABLE posts ADD COLUMN word_count INTEGER;
+    ALTER TABLE posts ADD COLUMN outline TEXT;
+    ALTER TABLE posts ADD COLUMN json_ld TEXT;
+    ALTER TABLE posts ADD COLUMN body_html TEXT;
+    ALTER TABLE posts ADD COLUMN derived_version INTEGER NOT NULL DEFAULT 0;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_posts_updated ON posts(updated_at, id);
+    CREATE INDEX IF NOT EXISTS idx_posts_status_updated ON posts(status, updated_at, id);
+    """,
+]
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.executescript(f"BEGIN; {script}; PRAGMA user_version={number}; COMMIT;")
+
+
 def init_db():
-    conn = db()
-    c = conn.cursor()
-    c.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            slug TEXT UNIQUE NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            slug TEXT UNIQUE NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            slug TEXT UNIQUE NOT NULL,
-            content TEXT NOT NULL,
-            excerpt TEXT,
-            status TEXT NOT NULL DEFAULT 'draft',
-            category_id INTEGER,
-            featured_image TEXT,
-            featured_image_alt TEXT,
-            meta_title TEXT,
-            meta_description TEXT,
-            canonical_url TEXT,
-            seo_keyword TEXT,
-            read_time INTEGER DEFAULT 1,
-            author_name TEXT DEFAULT 'Admin',
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            published_at TEXT,
-            FOREIGN KEY(category_id) REFERENCES categories(id)
-        );
-        CREATE TABLE IF NOT EXISTS post_tags (
-            post_id INTEGER,
-            tag_id INTEGER,
-            PRIMARY KEY(post_id, tag_id),
-            FOREIGN KEY(post_id) REFERENCES posts(id) ON DELETE CASCADE,
-            FOREIGN KEY(tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        );
-        CREATE TABLE IF NOT EXISTS analytics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id INTEGER,
-            path TEXT,
-            event_type TEXT,
-            value INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL
-        );
-        """
-    )
-    c.execute("SELECT id FROM users WHERE username='admin'")
-    if not c.fetchone():
-        c.execute("INSERT INTO users(username, password) VALUES (?, ?)", ("admin", "admin123"))
-    for cat in DEFAULT_CATEGORIES:
-        slug = slugify(cat)
-        c.execute("INSERT OR IGNORE INTO categories(name, slug) VALUES (?, ?)", (cat, slug))
-    conn.commit()
-    conn.close()
+    with db() as conn:
+        c = conn.cursor()
+        c.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                slug TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                slug TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                slug TEXT UNIQUE NOT NULL,
+                content TEXT NOT NULL,
+                excerpt TEXT,
+                status TEXT NOT NULL DEFAULT 'draft',
+                category_id INTEGER,
+                featured_image TEXT,
+                featured_image_alt TEXT,
+                meta_title TEXT,
+                meta_description TEXT,
+                canonical_url TEXT,
+                seo_keyword TEXT,
+                read_time INTEGER DEFAULT 1,
+                author_name TEXT DEFAULT 'Admin',
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                published_at TEXT,
+                FOREIGN KEY(category_id) REFERENCES categories(id)
+            );
+            CREATE TABLE IF NOT EXISTS post_tags (
+                post_id INTEGER,
+                tag_id INTEGER,
+                PRIMARY KEY(post_id, tag_id),
+                FOREIGN KEY(post_id) REFERENCES posts(id) ON DELETE CASCADE,
+                FOREIGN KEY(tag_id) REFERENCES tags(id) ON DELETE CASCADE
+            );
+            CREATE TABLE IF NOT EXISTS analytics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id INTEGER,
+                path TEXT,
+                event_type TEXT,
+                value INTEGER DEFAULT 0,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_analytics_created ON analytics(created_at);
+            CREATE TABLE IF NOT EXISTS analytics_hourly (
+                bucket TEXT NOT NULL,
+                post_id INTEGER NOT NULL DEFAULT 0,
+                event_type TEXT NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(bucket, post_id, event_type)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_daily (
+                day TEXT NOT NULL,
+                post_id INTEGER NOT NULL DEFAULT 0,
+                event_type TEXT NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(day, post_id, event_type)
+            );
+            """
+        )
+        migrate(conn)
+        if not c.execute("SELECT 1 FROM analytics_daily LIMIT 1").fetchone():
+            # Existing databases: seed the rollups once from the raw events.
+            c.execute("INSERT INTO analytics_hourly SELECT substr(created_at, 1, 13), COALESCE(post_id, 0), event_type, COUNT(*) FROM analytics GROUP BY 1, 2, 3")
+            c.execute("INSERT INTO analytics_daily SELECT substr(created_at, 1, 10), COALESCE(post_id, 0), event_type, COUNT(*) FROM analytics GROUP BY 1, 2, 3")
+        global FTS_ENABLED
+        fts_existed = c.execute("SELECT 1 FROM sqlite_master WHERE name='posts_fts'").fetchone()
+        try:
+            c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, body, excerpt, tags, tokenize='unicode61 remove_diacritics 2')")
+            FTS_ENABLED = True
+        except sqlite3.OperationalError:
+            FTS_ENABLED = False  # SQLite built without FTS5: search falls back to LIKE
+        if FTS_ENABLED and not fts_existed:
+            fts_rebuild(conn)
+        c.execute("SELECT id FROM users WHERE username='admin'")
+        if not c.fetchone():
+            c.execute("INSERT INTO users(username, password) VALUES (?, ?)", ("admin", "admin123"))
+        for cat in DEFAULT_CATEGORIES:
+            slug = slugify(cat)
+            c.execute("INSERT OR IGNORE INTO categories(name, slug) VALUES (?, ?)", (cat, slug))
 
 
 def slugify(value: str):
@@ -123,12 +445,18 @@ def strip_html(s: str):
 
 
 def reading_time_minutes(content: str):
-    words = max(1, len(strip_html(content).split()))
-    return max(1, round(words / 220))
+    return minutes_to_read(len(strip_html(content).split()))
+
+
+def minutes_to_read(words: int):
+    return max(1, round(max(1, words) / 220))
 
 
 def excerpt_from(content: str):
-    text = strip_html(content).strip()
+    return clip(strip_html(content).strip())
+
+
+def clip(text: str):
     return (text[:157] + "...") if len(text) > 160 else text
 
 
@@ -136,7 +464,78 @@ def validate_headings(content: str):
     return bool(re.search(r"<h1[\s>]", content, re.I)) and bool(re.search(r"<h2[\s>]", content, re.I))
 
 
-def seo_guard(payload):
+def analyze_content(content: str):
+    """Text-derived fields of a post body, computed in one go on save."""
+    # One pass over the tags: joined as-is it is strip_html() text (word count, read time, excerpt keep their counting rules);
+    # joined with spaces it is the search text, where adjacent elements stay apart ("<p>Hola</p><h2>Intro" -> "Hola Intro").
+    parts = re.split(r"<[^>]*>", content)
+    text = "".join(parts)
+    plain = " ".join(html.unescape(" ".join(parts)).split())
+    words = len(text.split())
+    outline = [(int(level), " ".join(html.unescape(strip_html(inner)).split()))
+               for level, inner in re.findall(r"<h([1-6])[^>]*>(.*?)</h\1\s*>", content, re.I | re.S)]
+    return {"plain_text": plain, "word_count": words, "read_time": minutes_to_read(words),
+            "excerpt": clip(text.strip()), "outline": outline}
+
+
+def fts_text(s: str):
+    # unicode61 keeps a run of hanzi as a single token; split them so 中文 matches inside 我学中文
+    return " ".join(re.sub(f"([{CJK}])", r" \1 ", s).split())
+
+
+def fts_query(q: str):
+    terms = []
+    for word in re.findall(r"\w+", q):
+        if re.search(f"[{CJK}]", word):
+            terms.append('"' + " ".join(fts_text(word).split()) + '"')
+        else:
+            terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def fts_index_post(conn, pid):
+    conn.execute("DELETE FROM posts_fts WHERE rowid=?", (pid,))
+    row = conn.execute("""SELECT p.title, p.content, p.plain_text, p.excerpt, p.status,
+                          (SELECT group_concat(t.name, ' ') FROM tags t JOIN post_tags pt ON pt.tag_id=t.id WHERE pt.post_id=p.id) tags
+                          FROM posts p WHERE p.id=?""", (pid,)).fetchone()
+    if row and row['status'] == 'published':
+        conn.execute("INSERT INTO posts_fts(rowid, title, body, excerpt, tags) VALUES(?,?,?,?,?)",
+                     (pid, fts_text(row['title']), fts_text(row['plain_text'] or analyze_content(row['content'])['plain_text']), fts_text(row['excerpt'] or ''), fts_text(row['tags'] or '')))
+
+
+def fts_rebuild(conn):
+    conn.execute("DELETE FROM posts_fts")
+    ids = [r[0] for r in conn.execute("SELECT id FROM posts WHERE status='published'").fetchall()]
+    for pid in ids:
+        fts_index_post(conn, pid)
+    return len(ids)
+
+
+def highlight(snippet: str):
+    s = html.escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+    return re.sub(f"(?<=[{CJK}])(</mark>)?\\s+(<mark>)?(?=[{CJK}])", r"\1\2", s)
+
+
+def search_posts(conn, q, page):
+    offset = (page - 1) * SEARCH_PAGE_SIZE
+    if not FTS_ENABLED:
+        where = "FROM posts p LEFT JOIN categories c ON c.id=p.category_id WHERE p.status='published' AND (p.title LIKE ? OR p.content LIKE ?)"
+        args = [f"%{q}%", f"%{q}%"]
+        total = conn.execute(f"SELECT COUNT(*) {where}", args).fetchone()[0]
+        rows = conn.execute(f"SELECT p.slug, p.title, p.read_time, c.name category_name, p.excerpt snippet {where} ORDER BY p.published_at DESC LIMIT ? OFFSET ?", args + [SEARCH_PAGE_SIZE, offset]).fetchall()
+        return rows, total
+    match = fts_query(q)
+    if not match:
+        return [], 0
+    total = conn.execute("SELECT COUNT(*) FROM posts_fts WHERE posts_fts MATCH ?", (match,)).fetchone()[0]
+    rows = conn.execute("""SELECT p.slug, p.title, p.read_time, c.name category_name, snippet(posts_fts, 1, ?, ?, '…', 24) snippet
+                           FROM posts_fts JOIN posts p ON p.id=posts_fts.rowid LEFT JOIN categories c ON c.id=p.category_id
+                           WHERE posts_fts MATCH ? ORDER BY bm25(posts_fts, 10.0, 1.0, 4.0, 6.0) LIMIT ? OFFSET ?""",
+                        ("\x02", "\x03", match, SEARCH_PAGE_SIZE, offset)).fetchall()
+    return rows, total
+
+
+def seo_guard(payload, outline=None):
     missing = []
     if not payload.get("title"):
         missing.append("title")
@@ -148,11 +547,162 @@ def seo_guard(payload):
         missing.append("meta_description")
     if not payload.get("featured_image_alt"):
         missing.append("featured_image_alt")
-    if not validate_headings(payload.get("content", "")):
+    if not (validate_headings(payload.get("content", "")) if outline is None else {1, 2} <= {level for level, _ in outline}):
         missing.append("headings(H1/H2)")
     return missing
 
 
+def image_size(fp):
+    """(width, height) read from the WebP/PNG/GIF/JPEG header, or (None, None)."""
+    with open(fp, "rb") as f:
+        head = f.read(32)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            if head[12:16] == b"VP8 ":
+                return int.from_bytes(head[26:28], "little") & 0x3FFF, int.from_bytes(head[28:30], "little") & 0x3FFF
+            if head[12:16] == b"VP8L":
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if head[12:16] == b"VP8X":
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        elif head[:4] == b"\x89PNG":
+            return int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+        elif head[:4] == b"GIF8":
+            return int.from_bytes(head[6:8], "little"), int.from_bytes(head[8:10], "little")
+        elif head[:2] == b"\xff\xd8":
+            f.seek(2)
+            while (byte := f.read(1)):
+                if byte != b"\xff":
+                    continue
+                marker = f.read(1)
+                while marker == b"\xff":
+                    marker = f.read(1)
+                if not marker or marker[0] == 0xD9:
+                    break
+                if marker[0] == 0x01 or 0xD0 <= marker[0] <= 0xD8:
+                    continue
+                size = f.read(2)
+                length = int.from_bytes(size, "big")
+                if len(size) < 2 or length < 2:
+                    break  # truncated or corrupt segment
+                if 0xC0 <= marker[0] <= 0xCF and marker[0] not in (0xC4, 0xC8, 0xCC):
+                    sof = f.read(5)
+                    if len(sof) < 5:
+                        break
+                    return int.from_bytes(sof[3:5], "big"), int.from_bytes(sof[1:3], "big")
+                f.seek(length - 2, 1)
+    return None, None
+
+
+def variant_name(filename, width):
+    return f"{Path(filename).stem}-{width}w.webp"
+
+
+def store_upload(stream, length, name):
+    """Stream an upload to disk in chunks and store it content-addressed; returns the stored filename."""
+    digest = hashlib.sha256()
+    tmp = UPLOADS_DIR / f".upload-{secrets.token_hex(8)}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            remaining = length
+            while remaining > 0:
+                chunk = stream.read(min(64 * 1024, remaining))
+                if not chunk:
+                    raise ValueError("Subida incompleta")
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+        with open(tmp, "rb") as f:
+            head = f.read(12)
+        ext = next((e for magic, e in IMAGE_TYPES.items() if head.startswith(magic)), None)
+        if not ext or (ext == ".webp" and head[8:12] != b"WEBP"):
+            raise ValueError("Formato de imagen no soportado")
+        sha = digest.hexdigest()
+        with db() as conn:
+            row = conn.execute("SELECT filename FROM uploads WHERE sha256=?", (sha,)).fetchone()
+            if row:
+                return row['filename']
+            filename = f"{slugify(Path(name).stem)}-{sha[:12]}{ext}"
+            width, height = image_size(tmp)
+            os.replace(tmp, UPLOADS_DIR / filename)
+            conn.execute("INSERT OR IGNORE INTO uploads(sha256, filename, bytes, width, height, created_at) VALUES(?,?,?,?,?,?)",
+                         (sha, filename, length, width, height, datetime.utcnow().isoformat()))
+            stored = conn.execute("SELECT filename FROM uploads WHERE sha256=?", (sha,)).fetchone()['filename']
+            if stored != filename:
+                (UPLOADS_DIR / filename).unlink(missing_ok=True)  # an identical upload committed first
+                return stored
+    finally:
+        tmp.unlink(missing_ok=True)
+    if Image is not None and width:
+        IMAGE_WORKERS.submit(make_variants, filename)
+    return filename
+
+
+def make_variants(filename):
+    try:
+        with Image.open(UPLOADS_DIR / filename) as im:
+            widths = [w for w in IMAGE_WIDTHS if w < im.width]
+            for w in widths:
+                tmp = UPLOADS_DIR / f".{variant_name(filename, w)}.tmp"
+                im.resize((w, round(im.height * w / im.width)), Image.LANCZOS).save(tmp, "WEBP", quality=80)
+                os.replace(tmp, UPLOADS_DIR / variant_name(filename, w))
+        with db() as conn:
+            conn.execute("UPDATE uploads SET variants=? WHERE filename=?", (json.dumps(widths), filename))
+            posts = conn.execute("SELECT id, slug FROM posts WHERE featured_image=?", (filename,)).fetchall()
+            for p in posts:
+                store_derived(conn, p['id'])
+            slugs = [p['slug'] for p in posts]
+        PAGE_CACHE.invalidate({f"/post/{slug}" for slug in slugs})
+    except (OSError, sqlite3.Error) as e:
+        print(f"image variants for {filename} failed: {e}", file=sys.stderr)
+
+
+def featured_image_html(conn, post):
+    filename = post['featured_image']
+    meta = conn.execute("SELECT width, height, variants FROM uploads WHERE filename=?", (filename,)).fetchone()
+    attrs = ""
+    if meta and meta['width']:
+        srcset = ", ".join([f"/uploads/{variant_name(filename, w)} {w}w" for w in json.loads(meta['variants'])] + [f"/uploads/{filename} {meta['width']}w"])
+        attrs = f" srcset='{srcset}' sizes='{IMAGE_SIZES}' width='{meta['width']}' height='{meta['height']}'"
+    return f"<img src='/uploads/{filename}' alt='{html.escape(post['featured_image_alt'] or post['title'])}' class='featured' decoding='async'{attrs}/>"
+
+
+def asset_url(name):
+    return f"/static/{ASSETS.get(name, name)}"
+
+
+def parse_range(header, size):
+    # Single byte range only; returns (start, end), None if unsatisfiable, False to ignore the header.
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or not (m[1] or m[2]):
+        return False
+    if m[1]:
+        start = int(m[1])
+        if m[2] and int(m[2]) < start:
+            return False
+        end = min(int(m[2]), size - 1) if m[2] else size - 1
+    else:
+        start, end = max(0, size - int(m[2])), size - 1
+        if not int(m[2]):
+            return None
+    return (start, end) if start < size else None
+
+
+def accepts_gzip(header):
+    # Accept-Encoding with q-values: "gzip;q=0" refuses gzip, "*" covers it unless gzip is listed explicitly.
+    weights = {}
+    for part in (header or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        m = re.search(r"\bq=([0-9.]+)", params)
+        try:
+            weights[coding.strip()] = float(m[1]) if m else 1.0
+        except ValueError:
+            weights[coding.strip()] = 0.0
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in weights:
+            return weights[coding] > 0
+    return False
+
+
 def base_layout(title, body, description="", canonical="", extra_head="", ga=True):
     theme_script = """
 <script>
@@ -173,10 +723,11 @@ gtag('config', '{GA4_ID}');
 """ if ga and GA4_ID else ""
     return f"""<!doctype html><html lang='es'><head><meta charset='utf-8'/><meta name='viewport' content='width=device-width,initial-scale=1'/>
 <title>{html.escape(title)}</title><meta name='description' content='{html.escape(description)}'/>{f"<link rel='canonical' href='{canonical}'/>" if canonical else ''}
-<link rel='stylesheet' href='/static/style.css'/>{extra_head}{theme_script}{ga_script}</head><body>
+<link rel='stylesheet' href='{asset_url("style.css")}'/><link rel='alternate' type='application/rss+xml' title='{APP_NAME}' href='/feed.xml'/>
+<link rel='alternate' type='application/atom+xml' title='{APP_NAME}' href='/atom.xml'/><link rel='alternate' type='application/feed+json' title='{APP_NAME}' href='/feed.json'/>{extra_head}{theme_script}{ga_script}</head><body>
 <header class='site-header'><a href='/' class='logo'>{APP_NAME}</a><nav><a href='/'>Inicio</a><a href='/about'>Autor</a><a href='/admin'>Admin</a><button id='themeToggle'>🌓</button></nav></header>
 <main>{body}</main><footer>Aprender chino, un día a la vez.</footer>
-<script src='/static/app.js'></script></body></html>"""
+<script src='{asset_url("app.js")}'></script></body></html>"""
 
 
 def json_ld(post):
@@ -193,21 +744,1084 @@ def json_ld(post):
     })
 
 
+def post_fragments(conn, pid, text=None):
+    """Derived columns of a post: analyzed text plus the pre-rendered JSON-LD and <article> fragment."""
+    post = conn.execute("SELECT p.*, c.name category_name FROM posts p LEFT JOIN categories c ON c.id=p.category_id WHERE p.id=?", (pid,)).fetchone()
+    tags = conn.execute("SELECT t.* FROM tags t JOIN post_tags pt ON pt.tag_id=t.id WHERE pt.post_id=?", (pid,)).fetchall()
+    text = text or analyze_content(post['content'])
+    img = featured_image_html(conn, post) if post['featured_image'] else ''
+    tag_html = " ".join([f"<a class='chip' href='/tag/{t['slug']}'>#{t['name']}</a>" for t in tags])
+    body = f"<article><h1>{html.escape(post['title'])}</h1><p class='meta'>{post['category_name'] or ''} · {post['read_time']} min · {(post['published_at'] or '')[:10]}</p>{img}<div class='content'>{post['content']}</div><div>{tag_html}</div><section class='author'><h3>Sobre el autor</h3><p>Aprendiz hispanohablante construyendo hábitos de estudio de mandarín.</p></section></article>"
+    return {"plain_text": text['plain_text'], "word_count": text['word_count'], "outline": json.dumps(text['outline'], ensure_ascii=False),
+            "json_ld": json_ld(post), "body_html": body, "derived_version": DERIVED_VERSION}
+
+
+def store_derived(conn, pid, text=None):
+    fields = post_fragments(conn, pid, text)
+    conn.execute(f"UPDATE posts SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?", (*fields.values(), pid))
+
+
+def backfill_derived(conn, everything=False, batch=500):
+    """Recompute derived columns for rows written by an older DERIVED_VERSION (or all rows); returns the count."""
+    done, last = 0, 0
+    while True:
+        ids = [r[0] for r in conn.execute(f"SELECT id FROM posts WHERE id > ? {'' if everything else 'AND derived_version < ?'} ORDER BY id LIMIT ?",
+                                          (last, batch) if everything else (last, DERIVED_VERSION, batch)).fetchall()]
+        if not ids:
+            return done
+        for pid in ids:
+            store_derived(conn, pid)
+        conn.commit()
+        done, last = done + len(ids), ids[-1]
+
+
+class AnalyticsWriter:
+    """Queues tracking events and writes them from one background thread in batched transactions."""
+
+    def __init__(self, batch_size, flush_seconds):
+        self.queue = queue.Queue()
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.thread = None
+        self.lock = threading.Lock()
+        self.last_compaction = 0.0
+
+    def record(self, post_id, path, event_type, value=0):
+        if self.thread is None:
+            self.start()
+        self.queue.put((post_id, path, event_type, value, datetime.utcnow().isoformat()))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="analytics-writer", daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=10):
+        # Drain: everything queued before the sentinel is flushed before the thread exits.
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def run(self):
+        conn = connect()
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                first = self.queue.get(timeout=60)
+            except queue.Empty:
+                first = False
+            if first is None:
+                stopping = True
+            elif first:
+                batch.append(first)
+                deadline = time.monotonic() + self.flush_seconds
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+            try:
+                if batch:
+                    self.flush(conn, batch)
+                if stopping or time.monotonic() - self.last_compaction > 3600:
+                    self.compact(conn)
+            except sqlite3.Error as e:
+                print(f"analytics writer: dropped {len(batch)} events: {e}", file=sys.stderr)
+        conn.close()
+
+    def flush(self, conn, batch):
+        hourly, daily = Counter(), Counter()
+        for post_id, _path, event_type, _value, created_at in batch:
+            hourly[(created_at[:13], post_id or 0, event_type)] += 1
+            daily[(created_at[:10], post_id or 0, event_type)] += 1
+        with conn:
+            conn.executemany("INSERT INTO analytics(post_id,path,event_type,value,created_at) VALUES(?,?,?,?,?)", batch)
+            conn.executemany("""INSERT INTO analytics_hourly(bucket, post_id, event_type, events) VALUES(?,?,?,?)
+                                ON CONFLICT(bucket, post_id, event_type) DO UPDATE SET events=events+excluded.events""", [(*k, n) for k, n in hourly.items()])
+            conn.executemany("""INSERT INTO analytics_daily(day, post_id, event_type, events) VALUES(?,?,?,?)
+                                ON CONFLICT(day, post_id, event_type) DO UPDATE SET events=events+excluded.events""", [(*k, n) for k, n in daily.items()])
+
+    def compact(self, conn):
+        # Raw events are already counted in the rollups; keep only a recent window of them.
+        self.last_compaction = time.monotonic()
+        now = datetime.utcnow()
+        with conn:
+            if ANALYTICS_RETENTION_DAYS > 0:
+                conn.execute("DELETE FROM analytics WHERE created_at < ?", ((now - timedelta(days=ANALYTICS_RETENTION_DAYS)).isoformat(),))
+            if ANALYTICS_HOURLY_RETENTION_DAYS > 0:
+                conn.execute("DELETE FROM analytics_hourly WHERE bucket < ?", ((now - timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS)).isoformat()[:13],))
+
+
+ANALYTICS = AnalyticsWriter(ANALYTICS_BATCH_SIZE, ANALYTICS_FLUSH_SECONDS)
+atexit.register(ANALYTICS.stop)
+
+
+CachedPage = namedtuple("CachedPage", "status body etag last_modified post_id")
+
+
+def mtime_ns(fp):
+    try:
+        return fp.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class PageCache:
+    """Bounded LRU of rendered public pages, keyed by decoded path + normalized query."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stamp = None  # prefork: file touched on every invalidation so sibling workers drop their copies
+        self.seen_stamp = None
+
+    def get(self, key):
+        stamp = mtime_ns(self.stamp) if self.stamp else None
+        with self.lock:
+            if stamp != self.seen_stamp:
+                self.entries.clear()
+                self.generation += 1
+                self.seen_stamp = stamp
+            page = self.entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, page, generation):
+        # A write that raced with the render bumped the generation: drop the stale page.
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = page
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, paths):
+        with self.lock:
+            self.generation += 1
+            for key in [k for k in self.entries if k.split("?", 1)[0] in paths]:
+                del self.entries[key]
+            if self.stamp:
+                self.stamp.touch()
+                self.seen_stamp = mtime_ns(self.stamp)
+
+
+PAGE_CACHE = PageCache(PAGE_CACHE_SIZE)
+
+
+class SessionStore:
+    """Admin sessions in SQLite with a TTL, so they survive restarts and are shared by prefork workers.
+
+    Lookups are cached per process for SESSION_CACHE_SECONDS; in prefork mode a logout touches a stamp file
+    that makes every worker drop its cache.
+    """
+
+    def __init__(self, ttl, cache_seconds, cache_size=1024):
+        self.ttl = ttl
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # token hash -> (username or None, expires_at, fresh_until)
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.seen_stamp = None
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()  # the database never holds usable tokens
+
+    def create(self, username):
+        token, now = secrets.token_hex(24), time.time()
+        with db() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            conn.execute("INSERT INTO sessions(token_hash, username, expires_at) VALUES(?,?,?)", (self.key(token), username, now + self.ttl))
+        return token
+
+    def get(self, token):
+        key, now = self.key(token), time.time()
+        stamp = mtime_ns(self.stamp) if self.stamp else None
+        with self.lock:
+            if stamp != self.seen_stamp:
+                self.cache.clear()
+                self.seen_stamp = stamp
+            hit = self.cache.get(key)
+        if hit and hit[2] > now:
+            return hit[0] if hit[1] > now else None
+        with db() as conn:
+            row = conn.execute("SELECT username, expires_at FROM sessions WHERE token_hash=? AND expires_at > ?", (key, now)).fetchone()
+        with self.lock:
+            self.cache[key] = (row['username'], row['expires_at'], now + self.cache_seconds) if row else (None, 0, now + self.cache_seconds)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return row['username'] if row else None
+
+    def delete(self, token):
+        key = self.key(token)
+        with self.lock:
+            self.cache.pop(key, None)
+        with db() as conn:
+            conn.execute("DELETE FROM sessions WHERE token_hash=?", (key,))
+        if self.stamp:
+            self.stamp.touch()
+
+
+SESSIONS = SessionStore(SESSION_TTL, SESSION_CACHE_SECONDS)
+
+
+ROUTE_PATTERNS = [
+    (re.compile(r"^/(post|category|tag)/[^/]+$"), r"/\1/:slug"),
+    (re.compile(r"^/(category|tag)/[^/]+/(feed\.xml|atom\.xml|feed\.json)$"), r"/\1/:slug/\2"),
+    (re.compile(r"^/admin/edit/[^/]+$"), "/admin/edit/:id"),
+    (re.compile(r"^/(static|uploads|sitemaps)/.+$"), r"/\1/*"),
+]
+
+
+def route_label(method, target, status):
+    """Low-cardinality route name for metrics: slugs and file names collapse, unknown paths become 'other'."""
+    url = urlparse(target)
+    for pattern, name in ROUTE_PATTERNS:
+        if pattern.match(url.path):
+            return f"{method} {pattern.sub(name, url.path)}"
+    if status and status >= 400:
+        return f"{method} other"
+    return f"{method} {url.path}{'?q' if url.path == '/' and 'q=' in url.query else ''}"
+
+
+class Metrics:
+    """Per-route latency histograms with DB/render/write totals; also keeps cProfile dumps of the slowest sampled requests."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.slowest = None  # min-heap of (seconds, profile path), loaded from PROFILE_DIR on first use
+        self.shed = Counter()  # reason -> requests answered 503 by admission control
+
+    def observe(self, route, total, db_time, render, write, queries):
+        with self.lock:
+            r = self.routes.get(route)
+            if r is None:
+                r = self.routes[route] = {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0, "db": 0.0, "render": 0.0, "write": 0.0, "queries": 0}
+            r["counts"][bisect.bisect_left(self.buckets, total)] += 1
+            r["count"] += 1
+            r["sum"] += total
+            r["db"] += db_time
+            r["render"] += render
+            r["write"] += write
+            r["queries"] += queries
+
+    def shed_request(self, reason):
+        with self.lock:
+            self.shed[reason] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {route: dict(r, counts=list(r["counts"])) for route, r in self.routes.items()}
+
+    def quantile(self, r, q):
+        # Linear interpolation inside the bucket holding the q-th observation.
+        rank, seen = q * r["count"], 0
+        for i, n in enumerate(r["counts"]):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return 0.0
+
+    def prometheus(self):
+        routes = self.snapshot()
+        label = lambda route: route.replace("\\", "\\\\").replace('"', '\\"')
+        lines = ["# HELP blog_request_duration_seconds Request latency by route.", "# TYPE blog_request_duration_seconds histogram"]
+        for route, r in sorted(routes.items()):
+            cumulative = 0
+            for le, n in zip([*self.buckets, "+Inf"], r["counts"]):
+                cumulative += n
+                lines.append(f'blog_request_duration_seconds_bucket{{route="{label(route)}",le="{le}"}} {cumulative}')
+            lines.append(f'blog_request_duration_seconds_sum{{route="{label(route)}"}} {r["sum"]:.6f}')
+            lines.append(f'blog_request_duration_seconds_count{{route="{label(route)}"}} {r["count"]}')
+        for key, help_text in (("db", "Time spent in SQLite"), ("render", "Time spent building the response"), ("write", "Time spent writing the response body")):
+            lines += [f"# HELP blog_request_{key}_seconds_total {help_text}, by route.", f"# TYPE blog_request_{key}_seconds_total counter"]
+            lines += [f'blog_request_{key}_seconds_total{{route="{label(route)}"}} {r[key]:.6f}' for route, r in sorted(routes.items())]
+        lines += ["# HELP blog_request_queries_total SQL statements executed, by route.", "# TYPE blog_request_queries_total counter"]
+        lines += [f'blog_request_queries_total{{route="{label(route)}"}} {r["queries"]}' for route, r in sorted(routes.items())]
+        lines += ["# TYPE blog_page_cache_hits_total counter", f"blog_page_cache_hits_total {PAGE_CACHE.hits}",
+                  "# TYPE blog_page_cache_misses_total counter", f"blog_page_cache_misses_total {PAGE_CACHE.misses}"]
+        lines += ["# HELP blog_requests_shed_total Requests refused with 503 by admission control.", "# TYPE blog_requests_shed_total counter"]
+        lines += [f'blog_requests_shed_total{{reason="{reason}"}} {n}' for reason, n in sorted(self.shed.items())]
+        return "\n".join(lines) + "\n"
+
+    def keep_profile(self, seconds, route, profiler):
+        with self.lock:
+            if self.slowest is None:
+                PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+                self.slowest = [(int(fp.name.split("ms-", 1)[0]) / 1000, fp) for fp in PROFILE_DIR.glob("*ms-*.prof") if fp.name.split("ms-", 1)[0].isdigit()]
+                heapq.heapify(self.slowest)
+            if len(self.slowest) >= PROFILE_KEEP and seconds <= self.slowest[0][0]:
+                return
+            fp = PROFILE_DIR / f"{int(seconds * 1000):06d}ms-{slugify(route)}-{time.time_ns()}.prof"
+            profiler.dump_stats(fp)
+            heapq.heappush(self.slowest, (seconds, fp))
+            while len(self.slowest) > PROFILE_KEEP:
+                heapq.heappop(self.slowest)[1].unlink(missing_ok=True)
+
+
+METRICS = Metrics(LATENCY_BUCKETS)
+PROFILE_LOCK = threading.Lock()  # one sampled profiler at a time
+
+
+def cache_key(path, qs):
+    return f"{path}?{urlencode(sorted(parse_qsl(qs)))}"
+
+
+def post_paths(conn, pid):
+    row = conn.execute("SELECT p.slug, c.slug category_slug FROM posts p LEFT JOIN categories c ON c.id=p.category_id WHERE p.id=?", (pid,)).fetchone()
+    if not row:
+        return set()
+    paths = {f"/post/{row['slug']}"}
+    if row['category_slug']:
+        paths.add(f"/category/{row['category_slug']}")
+    tags = conn.execute("SELECT t.slug FROM tags t JOIN post_tags pt ON pt.tag_id=t.id WHERE pt.post_id=?", (pid,)).fetchall()
+    return paths | {f"/tag/{t['slug']}" for t in tags}
+
+
+def render_search(conn, q, page):
+    rows, total = search_posts(conn, q, page)
+    cards = "".join([f"<article class='card'><a href='/post/{p['slug']}'><h2>{html.escape(p['title'])}</h2></a><p>{highlight(p['snippet'] or '')}</p><small>{p['category_name'] or ''} · {p['read_time']} min</small></article>" for p in rows]) or "<p>Sin resultados.</p>"
+    link = lambda n: f"/?{urlencode({'q': q, 'page': n})}"
+    prev = f"<a href='{link(page - 1)}'>← Anteriores</a>" if page > 1 else "<span></span>"
+    nxt = f"<a href='{link(page + 1)}'>Siguientes →</a>" if page * SEARCH_PAGE_SIZE < total else "<span></span>"
+    return f"<p>{total} resultado{'s' if total != 1 else ''} para «{html.escape(q)}»</p><div class='grid'>{cards}</div><nav class='pager'>{prev}{nxt}</nav>"
+
+
+SITEMAP_LOCK = threading.Lock()
+
+
+def write_gzip(fp, text):
+    tmp = fp.with_name(f"{fp.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(gzip.compress(text.encode("utf-8"), mtime=0))
+    os.replace(tmp, fp)
+
+
+def w3c_date(value):
+    # Date-only values stay as they are; naive timestamps are UTC; unparseable ones drop the <lastmod>.
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value).isoformat()
+        stamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)).isoformat(timespec="seconds")
+
+
+def sitemap_urlset(urls):
+    items = "".join(f"<url><loc>{html.escape(loc)}</loc>{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</url>" for loc, lastmod in urls)
+    return f"<?xml version='1.0' encoding='UTF-8'?><urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>{items}</urlset>"
+
+
+def sitemap_post_shard(conn, shard):
+    # Posts are sharded by id, so a save only ever touches the shard its id falls in.
+    first = shard * SITEMAP_SHARD_SIZE + 1
+    rows = conn.execute("SELECT slug, updated_at FROM posts WHERE id BETWEEN ? AND ? AND status='published' ORDER BY id", (first, first + SITEMAP_SHARD_SIZE - 1)).fetchall()
+    if not rows:
+        (SITEMAP_DIR / f"posts-{shard}.xml.gz").unlink(missing_ok=True)
+        return
+    write_gzip(SITEMAP_DIR / f"posts-{shard}.xml.gz", sitemap_urlset((f"{BASE_URL}/post/{quote(r['slug'])}", w3c_date(r['updated_at'])) for r in rows))
+
+
+def sitemap_pages(conn):
+    latest = conn.execute("SELECT MAX(updated_at) FROM posts WHERE status='published'").fetchone()[0]
+    cats = conn.execute("SELECT c.slug, MAX(p.updated_at) lastmod FROM categories c JOIN posts p ON p.category_id=c.id AND p.status='published' GROUP BY c.id").fetchall()
+    tags = conn.execute("SELECT t.slug, MAX(p.updated_at) lastmod FROM tags t JOIN post_tags pt ON pt.tag_id=t.id JOIN posts p ON p.id=pt.post_id AND p.status='published' GROUP BY t.id").fetchall()
+    urls = [(f"{BASE_URL}/", w3c_date(latest)), (f"{BASE_URL}/about", None)]
+    urls += [(f"{BASE_URL}/category/{quote(r['slug'])}", w3c_date(r['lastmod'])) for r in cats]
+    urls += [(f"{BASE_URL}/tag/{quote(r['slug'])}", w3c_date(r['lastmod'])) for r in tags]
+    write_gzip(SITEMAP_DIR / "pages.xml.gz", sitemap_urlset(urls))
+
+
+def sitemap_index(conn):
+    shards = conn.execute("SELECT (id - 1) / ? shard, MAX(updated_at) lastmod FROM posts WHERE status='published' GROUP BY shard ORDER BY shard", (SITEMAP_SHARD_SIZE,)).fetchall()
+    entries = [("pages", w3c_date(max([r['lastmod'] for r in shards], default=None)))] + [(f"posts-{r['shard']}", w3c_date(r['lastmod'])) for r in shards]
+    live = {f"{name}.xml.gz" for name, _ in entries}
+    for fp in SITEMAP_DIR.glob("posts-*.xml.gz"):
+        if fp.name not in live:
+            fp.unlink(missing_ok=True)
+    items = "".join(f"<sitemap><loc>{BASE_URL}/sitemaps/{name}.xml</loc>{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</sitemap>" for name, lastmod in entries)
+    write_gzip(SITEMAP_DIR / "index.xml.gz", f"<?xml version='1.0' encoding='UTF-8'?><sitemapindex xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>{items}</sitemapindex>")
+    return [r['shard'] for r in shards]
+
+
+def sitemap_refresh(conn, post_ids=None):
+    """Regenerate the index, the pages shard and the post shards holding post_ids (all shards if None)."""
+    with SITEMAP_LOCK:
+        shards = sitemap_index(conn)
+        sitemap_pages(conn)
+        for shard in (shards if post_ids is None else {(pid - 1) // SITEMAP_SHARD_SIZE for pid in post_ids}):
+            sitemap_post_shard(conn, shard)
+
+
+def parse_cursor(value):
+    published_at, _, pid = value.rpartition('~')
+    return (published_at, int(pid)) if published_at and pid.isdigit() else None
+
+
+class PostMeta:
+    __slots__ = ('id', 'slug', 'title', 'excerpt', 'read_time', 'published_at', 'updated_at', 'category_id', 'tags')
+
+    def __init__(self, row, tags):
+        self.id, self.slug, self.title, self.excerpt = row['id'], row['slug'], row['title'], row['excerpt']
+        self.read_time, self.published_at, self.updated_at = row['read_time'], row['published_at'] or '', row['updated_at'] or ''
+        self.category_id, self.tags = row['category_id'], tags
+
+
+class TaxonomyIndex:
+    """Published-post metadata kept in process: slug, category and tag lookups, listings and related posts without SQL.
+
+    Id lists are arrays sorted by (published_at, id); saves update them in place and touch the stamp so other workers reload.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.seen_stamp = None
+        self.loaded = False
+        self.version = 0  # bumped on every change; FEEDS drops its entries when it moves
+        self.reset()
+
+    def reset(self):
+        self.posts, self.slugs, self.order = {}, {}, array('q')
+        self.by_category, self.by_tag, self.cooccur, self.related_memo = {}, {}, {}, {}
+        self.terms = {'category': {}, 'tag': {}}  # kind -> id -> (name, slug)
+        self.term_slugs = {'category': {}, 'tag': {}}
+
+    def sort_key(self, pid):
+        return (self.posts[pid].published_at, pid)
+
+    def load(self, conn):
+        stamp = mtime_ns(self.stamp) if self.stamp else None
+        rows = conn.execute("SELECT id, slug, title, excerpt, read_time, published_at, updated_at, category_id FROM posts WHERE status='published' ORDER BY published_at, id").fetchall()
+        tags = {}
+        for pid, tid in conn.execute("SELECT pt.post_id, pt.tag_id FROM post_tags pt JOIN posts p ON p.id=pt.post_id AND p.status='published' ORDER BY pt.tag_id"):
+            tags.setdefault(pid, []).append(tid)
+        with self.lock:
+            self.reset()
+            for kind, table in (('category', 'categories'), ('tag', 'tags')):
+                for t in conn.execute(f"SELECT id, name, slug FROM {table}"):
+                    self.terms[kind][t['id']] = (t['name'], t['slug']); self.term_slugs[kind][t['slug']] = t['id']
+            for row in rows:
+                self.insert(PostMeta(row, tuple(tags.get(row['id'], ()))), append=True)
+            self.seen_stamp, self.loaded = stamp, True
+            self.version += 1
+
+    def fresh(self, conn=None):
+        # Callers already holding a pooled connection pass it in so a reload never waits on the pool.
+        if not self.loaded or (self.stamp and mtime_ns(self.stamp) != self.seen_stamp):
+            if conn is not None:
+                return self.load(conn)
+            with db() as conn:
+                self.load(conn)
+
+    def insert(self, meta, append=False):
+        # Caller holds the lock; append=True when rows arrive already sorted (full load).
+        self.posts[meta.id] = meta
+        self.slugs[meta.slug] = meta.id
+        lists = [self.order] + [self.by_tag.setdefault(t, array('q')) for t in meta.tags]
+        if meta.category_id is not None:
+            lists.append(self.by_category.setdefault(meta.category_id, array('q')))
+        for ids in lists:
+            if append:
+                ids.append(meta.id)
+            else:
+                ids.insert(bisect.bisect_left(ids, self.sort_key(meta.id), key=self.sort_key), meta.id)
+        for t in meta.tags:
+            pairs = self.cooccur.setdefault(t, Counter())
+            pairs.update(o for o in meta.tags if o != t)
+
+    def discard(self, pid):
+        meta = self.posts.get(pid)
+        if not meta:
+            return
+        for ids in [self.order, self.by_category.get(meta.category_id)] + [self.by_tag.get(t) for t in meta.tags]:
+            if ids is not None and pid in ids:
+                ids.remove(pid)
+        for t in meta.tags:
+            pairs = self.cooccur[t]
+            pairs.subtract(o for o in meta.tags if o != t)
+            for o in [o for o, n in pairs.items() if n <= 0]:
+                del pairs[o]
+        del self.posts[pid], self.slugs[meta.slug]
+
+    def update(self, conn, pid):
+        """Re-read one post after a save; returns the post pages whose related list may have changed."""
+        row = conn.execute("SELECT id, slug, title, excerpt, read_time, published_at, updated_at, category_id FROM posts WHERE id=? AND status='published'", (pid,)).fetchone()
+        tags = tuple(r[0] for r in conn.execute("SELECT tag_id FROM post_tags WHERE post_id=? ORDER BY tag_id", (pid,))) if row else ()
+        self.fresh(conn)
+        with self.lock:
+            old = self.posts.get(pid)
+            neighbours = {o for t in set(tags) | set(old.tags if old else ()) for o in self.by_tag.get(t, ())}
+            self.discard(pid)
+            if row:
+                self.insert(PostMeta(row, tags))
+            self.related_memo.clear()
+            self.touch()
+            return {f"/post/{self.posts[o].slug}" for o in neighbours if o in self.posts}
+
+    def add_term(self, conn, kind, row):
+        self.fresh(conn)
+        with self.lock:
+            self.terms[kind][row['id']] = (row['name'], row['slug']); self.term_slugs[kind][row['slug']] = row['id']
+            self.touch()
+
+    def touch(self):
+        self.version += 1
+        if self.stamp:
+            self.stamp.touch()
+            self.seen_stamp = mtime_ns(self.stamp)
+
+    def card(self, meta):
+        category = self.terms['category'].get(meta.category_id)
+        return {'id': meta.id, 'slug': meta.slug, 'title': meta.title, 'excerpt': meta.excerpt, 'read_time': meta.read_time,
+                'published_at': meta.published_at, 'updated_at': meta.updated_at, 'category_name': category[0] if category else None,
+                'tags': [self.terms['tag'][t][0] for t in meta.tags if t in self.terms['tag']]}
+
+    def page(self, cursor, category_id=None, tag_id=None, size=PAGE_SIZE):
+        """Same contract as a keyset query on (published_at, id): newest first, `size` rows and the next cursor."""
+        self.fresh()
+        with self.lock:
+            ids = self.by_tag.get(tag_id, ()) if tag_id is not None else self.by_category.get(category_id, ()) if category_id is not None else self.order
+            end = bisect.bisect_left(ids, tuple(cursor), key=self.sort_key) if cursor else len(ids)
+            window = ids[max(0, end - size - 1):end][::-1]
+            rows = [self.card(self.posts[pid]) for pid in window[:size]]
+            next_cursor = f"{rows[-1]['published_at']}~{rows[-1]['id']}" if len(window) > size else None
+            return rows, next_cursor
+
+    def term(self, kind, slug):
+        self.fresh()
+        with self.lock:
+            tid = self.term_slugs[kind].get(slug)
+            return (tid, self.terms[kind][tid][0]) if tid is not None else None
+
+    def categories(self):
+        self.fresh()
+        with self.lock:
+            return sorted(self.terms['category'].values())
+
+    def post_id(self, slug):
+        self.fresh()
+        return self.slugs.get(slug)
+
+    def related(self, pid, limit=RELATED_POSTS):
+        # Ranked by shared tags, newest first on ties; memoized until the next save.
+        self.fresh()
+        with self.lock:
+            if pid not in self.related_memo:
+                meta, scores = self.posts.get(pid), Counter()
+                for t in meta.tags if meta else ():
+                    scores.update(o for o in self.by_tag[t] if o != pid)
+                best = heapq.nlargest(limit, scores, key=lambda o: (scores[o], self.sort_key(o)))
+                self.related_memo[pid] = [(self.posts[o].slug, self.posts[o].title) for o in best]
+            return self.related_memo[pid]
+
+    def related_tags(self, tid, limit=8):
+        self.fresh()
+        with self.lock:
+            return [(self.terms['tag'][o][0], self.terms['tag'][o][1], n) for o, n in self.cooccur.get(tid, Counter()).most_common(limit)]
+
+
+TAXONOMY = TaxonomyIndex()
+
+Feed = namedtuple("Feed", "content_type body gz etag last_modified")
+FEED_TYPES = {'feed.xml': 'application/rss+xml', 'atom.xml': 'application/atom+xml', 'feed.json': 'application/feed+json'}
+
+
+def feed_time(value):
+    try:
+        return datetime.fromisoformat(value[:19]).replace(tzinfo=timezone.utc).timestamp() if value else None
+    except ValueError:
+        return None
+
+
+def render_feed(name, kind=None, slug=None):
+    """RSS 2.0, Atom or JSON Feed 1.1 for the newest published posts of the site, a category or a tag; None if the term is unknown."""
+    scope, title, base = {}, APP_NAME, ''
+    if kind:
+        entity = TAXONOMY.term(kind, slug)
+        if not entity:
+            return None
+        scope, title, base = {f"{kind}_id": entity[0]}, f"{APP_NAME} · {entity[1]}", f"/{kind}/{quote(slug)}"
+    posts, _next = TAXONOMY.page(None, size=FEED_SIZE, **scope)
+    home, self_url = f"{BASE_URL}{base or '/'}", f"{BASE_URL}{base}/{name}"
+    updated = max([feed_time(p['updated_at']) or 0 for p in posts], default=0) or time.time()
+    iso = lambda ts: time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+    items = [(p, f"{BASE_URL}/post/{quote(p['slug'])}", feed_time(p['published_at']) or updated, feed_time(p['updated_at']) or updated) for p in posts]
+    esc = html.escape
+    terms = lambda p, fmt: "".join(fmt.format(esc(t)) for t in p['tags'])
+    atom_term = "<category term='{}'/>"
+    if name == 'feed.json':
+        text = json.dumps({"version": "https://jsonfeed.org/version/1.1", "title": title, "home_page_url": home, "feed_url": self_url, "language": "es",
+                           "items": [{"id": url, "url": url, "title": p['title'], "summary": p['excerpt'] or '', "content_text": p['excerpt'] or '',
+                                      "date_published": iso(published), "date_modified": iso(modified), "tags": p['tags']} for p, url, published, modified in items]},
+                          ensure_ascii=False)
+    elif name == 'atom.xml':
+        entries = "".join(f"<entry><title>{esc(p['title'])}</title><id>{esc(url)}</id><link href='{esc(url)}'/><published>{iso(published)}</published><updated>{iso(modified)}</updated>"
+                          f"<summary>{esc(p['excerpt'] or '')}</summary>{terms(p, atom_term)}</entry>" for p, url, published, modified in items)
+        text = (f"<?xml version='1.0' encoding='UTF-8'?><feed xmlns='http://www.w3.org/2005/Atom' xml:lang='es'><title>{esc(title)}</title><id>{esc(self_url)}</id>"
+                f"<link rel='self' href='{esc(self_url)}'/><link href='{esc(home)}'/><updated>{iso(updated)}</updated><author><name>{esc(APP_NAME)}</name></author>{entries}</feed>")
+    else:
+        entries = "".join(f"<item><title>{esc(p['title'])}</title><link>{esc(url)}</link><guid isPermaLink='true'>{esc(url)}</guid><pubDate>{formatdate(published, usegmt=True)}</pubDate>"
+                          f"<description>{esc(p['excerpt'] or '')}</description>{terms(p, '<category>{}</category>')}</item>" for p, url, published, _modified in items)
+        text = (f"<?xml version='1.0' encoding='UTF-8'?><rss version='2.0' xmlns:atom='http://www.w3.org/2005/Atom'><channel><title>{esc(title)}</title><link>{esc(home)}</link>"
+                f"<description>Blog para aprender mandarín desde cero en español.</description><language>es</language><atom:link href='{esc(self_url)}' rel='self' type='application/rss+xml'/>"
+                f"<lastBuildDate>{formatdate(updated, usegmt=True)}</lastBuildDate>{entries}</channel></rss>")
+    return text, updated
+
+
+class FeedCache:
+    """Feeds rendered and gzipped once per content change: entries are dropped whenever TAXONOMY.version moves."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.version = None
+
+    def get(self, name, kind=None, slug=None):
+        TAXONOMY.fresh()
+        version, key = TAXONOMY.version, (name, kind, slug)
+        with self.lock:
+            if self.version != version:
+                self.entries.clear()
+                self.version = version
+            feed = self.entries.get(key)
+        if feed is None:
+            rendered = render_feed(name, kind, slug)
+            if rendered is None:
+                return None
+            text, updated = rendered
+            body = text.encode("utf-8")
+            feed = Feed(f"{FEED_TYPES[name]}; charset=utf-8", body, gzip.compress(body, mtime=0), f'"{hashlib.sha1(body).hexdigest()}"', updated)
+            with self.lock:
+                if self.version == version == TAXONOMY.version:
+                    self.entries[key] = feed
+        return feed
+
+
+FEEDS = FeedCache()
+
+
+def admin_post_page(conn, cursor, status=None, category_id=None, tag_id=None, q=''):
+    # Keyset pagination on (updated_at, id) plus per-status counts for the same filters; post bodies are never read.
+    where, args = [], []
+    if category_id is not None:
+        where.append("p.category_id=?"); args.append(category_id)
+    if tag_id is not None:
+        where.append("p.id IN (SELECT post_id FROM post_tags WHERE tag_id=?)"); args.append(tag_id)
+    if q:
+        where.append("p.title LIKE ? ESCAPE '\\'"); args.append("%" + re.sub(r"([\\%_])", r"\\\1", q) + "%")
+    counts = dict(conn.execute(f"SELECT p.status, COUNT(*) FROM posts p {'WHERE ' + ' AND '.join(where) if where else ''} GROUP BY p.status", args).fetchall())
+    if status:
+        where.append("p.status=?"); args.append(status)
+    if cursor:
+        where.append("(p.updated_at, p.id) < (?, ?)"); args.extend(cursor)
+    rows = conn.execute(f"""SELECT p.id, p.title, p.status, p.updated_at, c.name category_name FROM posts p LEFT JOIN categories c ON c.id=p.category_id
+                            {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY p.updated_at DESC, p.id DESC LIMIT ?""", args + [ADMIN_PAGE_SIZE + 1]).fetchall()
+    next_cursor = f"{rows[ADMIN_PAGE_SIZE - 1]['updated_at']}~{rows[ADMIN_PAGE_SIZE - 1]['id']}" if len(rows) > ADMIN_PAGE_SIZE else None
+    return rows[:ADMIN_PAGE_SIZE], next_cursor, counts
+
+
+def render_admin_posts(query):
+    params = {k: v[0].strip() for k, v in parse_qs(query).items()}
+    status = params.get('status') if params.get('status') in ('draft', 'published') else None
+    category_id = int(params['category']) if params.get('category', '').isdigit() else None
+    tag_id = int(params['tag']) if params.get('tag', '').isdigit() else None
+    q, cursor = params.get('q', ''), parse_cursor(params.get('after', ''))
+    with db() as conn:
+        posts, next_cursor, counts = admin_post_page(conn, cursor, status, category_id, tag_id, q)
+        cats = conn.execute("SELECT id, name FROM categories ORDER BY name").fetchall(); tags = conn.execute("SELECT id, name FROM tags ORDER BY name").fetchall()
+    filters = {k: v for k, v in (('status', status), ('category', category_id), ('tag', tag_id), ('q', q)) if v}
+    href = lambda **change: "/admin/posts" + (f"?{urlencode(p)}" if (p := {k: v for k, v in {**filters, **change}.items() if v}) else "")
+    tabs = " | ".join(f"<a href='{href(status=key)}'>{'<strong>' if status == key else ''}{label} ({n}){'</strong>' if status == key else ''}</a>"
+                      for key, label, n in ((None, 'Todos', sum(counts.values())), ('published', 'Publicados', counts.get('published', 0)), ('draft', 'Borradores', counts.get('draft', 0))))
+    cat_opts = ''.join(f"<option value='{c['id']}' {'selected' if c['id'] == category_id else ''}>{html.escape(c['name'])}</option>" for c in cats)
+    tag_opts = ''.join(f"<option value='{t['id']}' {'selected' if t['id'] == tag_id else ''}>{html.escape(t['name'])}</option>" for t in tags)
+    keep_status = f"<input type='hidden' name='status' value='{status}'/>" if status else ''
+    form = (f"<form method='get' action='/admin/posts' class='filters'>{keep_status}"
+            f"<input name='q' value='{html.escape(q, quote=True)}' placeholder='Buscar por título'/><select name='category'><option value=''>Todas las categorías</option>{cat_opts}</select>"
+            f"<select name='tag'><option value=''>Todos los tags</option>{tag_opts}</select><button>Filtrar</button></form>")
+    rows = ''.join([f"<tr><td>{html.escape(p['title'])}</td><td>{p['status']}</td><td>{html.escape(p['category_name'] or '')}</td><td>{p['updated_at'][:16].replace('T', ' ')}</td><td><a href='/admin/edit/{p['id']}'>Editar</a></td></tr>" for p in posts])
+    nav = pager(href(), cursor, next_cursor, href(after=next_cursor))
+    return f"""<section class='admin'><h1>Panel</h1><a href='/admin/new'>+ Nuevo post</a> | <a href='/admin/analytics'>Analytics</a> | <a href='/admin/metrics'>Métricas</a> | <a href='/admin/categories'>Categorías/Tags</a> | <a href='/admin/logout'>Salir</a>
+<p>{tabs}</p>{form}<table><tr><th>Título</th><th>Estado</th><th>Categoría</th><th>Actualizado</th><th></th></tr>{rows}</table>{nav}</section>"""
+
+
+def post_card(p):
+    return f"<article class='card'><a href='/post/{p['slug']}'><h2>{html.escape(p['title'])}</h2></a><p>{html.escape(p['excerpt'] or '')}</p><small>{p['category_name'] or ''} · {p['read_time']} min</small></article>"
+
+
+def pager(base, cursor, next_cursor, older_href=None):
+    older_href = older_href or f"{base}?{urlencode({'after': next_cursor})}"
+    newer = f"<a href='{base}'>← Más recientes</a>" if cursor else "<span></span>"
+    older = f"<a href='{older_href}'>Más antiguos →</a>" if next_cursor else "<span></span>"
+    return f"<nav class='pager'>{newer}{older}</nav>" if cursor or next_cursor else ""
+
+
+def render_home(q, page=1, cursor=None, older_href=None):
+    if q:
+        with db() as conn:
+            results = render_search(conn, q, page)
+    else:
+        posts, next_cursor = TAXONOMY.page(cursor)
+        cards = "".join([post_card(p) for p in posts]) or "<p>No hay publicaciones aún.</p>"
+        results = f"<div class='grid'>{cards}</div>{pager('/', cursor, next_cursor, older_href)}"
+    cats_html = " ".join([f"<a class='chip' href='/category/{slug}'>{name}</a>" for name, slug in TAXONOMY.categories()])
+    body = f"<section><h1>Diario de aprendizaje de chino</h1><form><input name='q' placeholder='Buscar posts...' value='{html.escape(q)}'/><button>Buscar</button></form><div>{cats_html}</div>{results}</section>"
+    return 200, base_layout(APP_NAME, body, 'Blog para aprender mandarín desde cero en español.', f"{BASE_URL}/"), None
+
+
+def render_post(slug):
+    pid, post = TAXONOMY.post_id(slug), None
+    if pid is not None:
+        with db() as conn:
+            post = conn.execute("SELECT id, title, meta_title, meta_description, canonical_url, json_ld, body_html, derived_version FROM posts WHERE id=? AND status='published'", (pid,)).fetchone()
+            if post and post['derived_version'] != DERIVED_VERSION:
+                post = {**post, **post_fragments(conn, post['id'])}  # not backfilled yet: render from the source columns
+    if not post:
+        return 404, base_layout("No encontrado", "<h1>Post no encontrado</h1>"), None
+    schema = f"<script type='application/ld+json'>{post['json_ld']}</script>"
+    related = "".join(f"<li><a href='/post/{r_slug}'>{html.escape(r_title)}</a></li>" for r_slug, r_title in TAXONOMY.related(pid))
+    body = post['body_html'] + (f"<section class='related'><h3>Posts relacionados</h3><ul>{related}</ul></section>" if related else "")
+    return 200, base_layout(post['meta_title'] or post['title'], body, post['meta_description'] or '', post['canonical_url'] or f"{BASE_URL}/post/{slug}", schema), post['id']
+
+
+def render_listing(kind, slug, cursor=None, older_href=None):
+    posts, next_cursor, related = [], None, ""
+    entity = TAXONOMY.term(kind, slug)
+    if entity:
+        posts, next_cursor = TAXONOMY.page(cursor, **{f"{kind}_id": entity[0]})
+        if kind == 'tag':
+            related = " ".join(f"<a class='chip' href='/tag/{t_slug}'>#{t_name} ({n})</a>" for t_name, t_slug, n in TAXONOMY.related_tags(entity[0]))
+    cards = "".join([post_card(p) for p in posts]) or "<p>Sin resultados.</p>"
+    title = html.escape(entity[1]) if entity else 'No encontrado'
+    feed = f"<link rel='alternate' type='application/rss+xml' title='{title}' href='/{kind}/{quote(slug)}/feed.xml'/>" if entity else ""
+    return (200 if entity else 404), base_layout(entity[1] if entity else 'No encontrado', f"<h1>{title}</h1><div>{related}</div><div class='grid'>{cards}</div>{pager(f'/{kind}/{slug}', cursor, next_cursor, older_href)}", extra_head=feed), None
+
+
+def render_public(path, query):
+    cursor = parse_cursor(query.get('after', [''])[0])
+    if path == '/':
+        page = query.get('page', ['1'])[0]
+        return render_home(query.get('q', [''])[0].strip(), max(1, int(page)) if page.isdigit() else 1, cursor)
+    if path.startswith('/post/'):
+        return render_post(path.split('/post/', 1)[1])
+    if path.startswith('/category/') or path.startswith('/tag/'):
+        kind = 'category' if path.startswith('/category/') else 'tag'
+        return render_listing(kind, path.split(f'/{kind}/', 1)[1], cursor)
+    return 200, base_layout("Sobre el autor", "<h1>Hola, soy un estudiante de chino desde cero</h1><p>Este blog documenta estrategias prácticas para hispanohablantes.</p>"), None
+
+
+def robots_txt():
+    return f"User-agent: *\nAllow: /\nSitemap: {BASE_URL}/sitemap.xml\n"
+
+
+def is_public_page(path):
+    return path in ('/', '/about') or path.startswith(('/post/', '/category/', '/tag/'))
+
+
+def is_admin_path(path):
+    return path in ('/admin', '/metrics') or path.startswith('/admin/')
+
+
+def body_limit(path):
+    return BODY_LIMITS.get(path, MAX_BODY_BYTES)
+
+
+def content_length(value):
+    # ASCII digits only: str.isdigit() also accepts '²' and friends, which int() then rejects.
+    return int(value) if value and re.fullmatch(r"[0-9]+", value) else None
+
+
+def size_label(n):
+    return f"{n // (1024 * 1024)} MB" if n >= 1024 * 1024 else f"{n // 1024} KB"
+
+
+REFUSALS = {
+    400: ("Bad Request", lambda path: "Content-Length inválido"),
+    408: ("Request Timeout", lambda path: f"La cabecera no llegó en {READ_TIMEOUT:g} s"),
+    413: ("Payload Too Large", lambda path: f"La petición supera {size_label(body_limit(path))}"),
+    431: ("Request Header Fields Too Large", lambda path: "Cabeceras demasiado grandes"),
+    503: ("Service Unavailable", lambda path: f"Servidor saturado, reintenta en {RETRY_AFTER} s"),
+}
+
+
+def refusal(code, path):
+    """JSON error body and headers for a request refused before its body was read; the connection is closed after it."""
+    body = json.dumps({"error": REFUSALS[code][1](path)}, ensure_ascii=False).encode("utf-8")
+    headers = [("Content-Type", "application/json"), ("Content-Length", len(body)), ("Connection", "close")]
+    return body, headers + ([("Retry-After", RETRY_AFTER)] if code == 503 else [])
+
+
+def closing_response(code, path, version="HTTP/1.1"):
+    # Same refusal, as raw bytes for the engines to write without running a Handler.
+    body, headers = refusal(code, path)
+    return "\r\n".join([f"{version} {code} {REFUSALS[code][0]}", *[f"{k}: {v}" for k, v in headers], "", ""]).encode("latin-1") + body
+
+
+class Admission:
+    """Public requests in flight against a fixed limit; admin requests are counted but never refused."""
+
+    def __init__(self, public_limit):
+        self.public_limit = max(1, public_limit)
+        self.inflight = {False: 0, True: 0}  # keyed by is-admin
+        self.lock = threading.Lock()
+
+    def enter(self, admin):
+        with self.lock:
+            if not admin and self.inflight[False] >= self.public_limit:
+                return False
+            self.inflight[admin] += 1
+            return True
+
+    def leave(self, admin):
+        with self.lock:
+            self.inflight[admin] -= 1
+
+
+class DeadlineIO(socket.SocketIO):
+    """Raw socket reader with an optional total deadline checked before every recv, so a client trickling its request head can't pin a worker."""
+
+    deadline = None
+    preread = b""  # head bytes the accept triage already took off the socket
+
+    def readinto(self, b):
+        if self.preread:
+            n = min(len(b), len(self.preread))
+            b[:n], self.preread = self.preread[:n], self.preread[n:]
+            return n
+        if self.deadline is not None:
+            left = self.deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("request head not received in time")
+            self._sock.settimeout(left)
+        return super().readinto(b)
+
+
 class Handler(BaseHTTPRequestHandler):
+    timeout = READ_TIMEOUT
+    reader = None  # DeadlineIO under rfile when serving a socket
+
+    def setup(self):
+        super().setup()
+        self.rfile.close()  # swapped for a reader that enforces the head deadline
+        self.reader = DeadlineIO(self.connection, "rb")
+        self.reader.preread = getattr(self.server, 'heads', {}).pop(self.connection, b"")
+        self.rfile = io.BufferedReader(self.reader)
+
+    def handle_one_request(self):
+        REQUEST_STATS.current = None
+        if self.reader:
+            self.reader.deadline = time.monotonic() + READ_TIMEOUT
+        try:
+            super().handle_one_request()
+        finally:
+            stats, REQUEST_STATS.current = REQUEST_STATS.current, None
+            if stats:
+                self.record_metrics(stats)
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self.reader:
+            self.reader.deadline = None  # head is in; the body gets READ_TIMEOUT per read
+            self.connection.settimeout(READ_TIMEOUT)
+        stats = REQUEST_STATS.current = RequestStats()
+        if PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE and PROFILE_LOCK.acquire(blocking=False):
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+        path = urlparse(self.path).path
+        length = self.headers.get('Content-Length')
+        if length is not None and content_length(length) is None:
+            self.refuse(400, path); return False
+        if length and content_length(length) > body_limit(path):
+            self.refuse(413, path); return False
+        return True
+
+    def refuse(self, code, path):
+        # Answered before any body is read, so the connection can't be reused.
+        body, headers = refusal(code, path)
+        self.send_response(code)
+        for k, v in headers: self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def send_response(self, code, message=None):
+        stats = getattr(REQUEST_STATS, "current", None)
+        if stats:
+            stats.status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        # Everything before the headers go out is DB or render time; the body write is measured afterwards.
+        if self.connection:
+            self.connection.settimeout(WRITE_TIMEOUT)
+        stats = getattr(REQUEST_STATS, "current", None)
+        if stats and stats.headers_at is None:
+            stats.headers_at = time.perf_counter()
+            render = stats.headers_at - stats.started - stats.db
+            self.send_header("Server-Timing", f'db;dur={stats.db * 1000:.2f};desc="{stats.queries} queries", render;dur={render * 1000:.2f}')
+        super().end_headers()
+
+    def record_metrics(self, stats):
+        finished = time.perf_counter()
+        if stats.profiler:
+            stats.profiler.disable()
+            PROFILE_LOCK.release()
+        headers_at = stats.headers_at or finished
+        route = route_label(self.command, self.path, stats.status)
+        total = finished - stats.started
+        METRICS.observe(route, total, stats.db, headers_at - stats.started - stats.db, finished - headers_at, stats.queries)
+        if stats.profiler:
+            METRICS.keep_profile(total, route, stats.profiler)
+
     def send_html(self, content, status=200):
+        body = content.encode("utf-8")
         self.send_response(status)
         self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        self.wfile.write(content.encode("utf-8"))
+        self.wfile.write(body)
 
     def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self, etag, last_modified):
+        inm = self.headers.get("If-None-Match")
+        if inm:
+            return inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                return int(parsedate_to_datetime(ims).timestamp()) >= int(last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_page(self, path, qs):
+        key = cache_key(path, qs)
+        page = PAGE_CACHE.get(key)
+        if page is None:
+            generation = PAGE_CACHE.generation
+            status, content, post_id = render_public(path, parse_qs(qs))
+            body = content.encode("utf-8")
+            page = CachedPage(status, body, f'"{hashlib.sha1(body).hexdigest()}"', time.time(), post_id)
+            if status == 200:
+                PAGE_CACHE.put(key, page, generation)
+        if path == '/' or page.post_id:
+            self.track(path, 'pageview', page.post_id)
+        if page.status == 200 and self.not_modified(page.etag, page.last_modified):
+            self.send_response(304)
+            self.send_header("ETag", page.etag)
+            self.send_header("Last-Modified", formatdate(page.last_modified, usegmt=True))
+            self.end_headers()
+            return
+        self.send_response(page.status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page.body)))
+        if page.status == 200:
+            self.send_header("ETag", page.etag)
+            self.send_header("Last-Modified", formatdate(page.last_modified, usegmt=True))
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(page.body)
+
+    def send_feed(self, name, kind, slug):
+        feed = FEEDS.get(name, kind, slug)
+        if feed is None:
+            self.send_html(base_layout("No encontrado", "<h1>Feed no encontrado</h1>"), 404); return
+        gz = accepts_gzip(self.headers.get('Accept-Encoding'))
+        etag = f'{feed.etag[:-1]}-gz"' if gz else feed.etag  # each encoding is its own representation
+        validators = [("ETag", etag), ("Last-Modified", formatdate(feed.last_modified, usegmt=True)), ("Cache-Control", "public, max-age=300"), ("Vary", "Accept-Encoding")]
+        if self.not_modified(etag, feed.last_modified):
+            self.send_response(304)
+            for k, v in validators: self.send_header(k, v)
+            self.end_headers()
+            return
+        body = feed.gz if gz else feed.body
+        self.send_response(200)
+        self.send_header("Content-Type", feed.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        for k, v in validators: self.send_header(k, v)
         self.end_headers()
-        self.wfile.write(json.dumps(payload).encode("utf-8"))
+        self.wfile.write(body)
+
+    def send_file(self, root, name, cache_control, content_type=None, headers=()):
+        try:
+            fp = (root / name).resolve()
+            fp.relative_to(root.resolve())
+        except (ValueError, OSError):
+            return False
+        if not fp.is_file():
+            return False
+        st = fp.stat()
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        validators = [("ETag", etag), ("Last-Modified", formatdate(st.st_mtime, usegmt=True)), ("Cache-Control", cache_control), *headers]
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(304)
+            for k, v in validators: self.send_header(k, v)
+            self.end_headers()
+            return True
+        start, end, status = 0, st.st_size - 1, 200
+        rng = self.headers.get("Range")
+        if rng and self.headers.get("If-Range", etag) == etag:
+            span = parse_range(rng, st.st_size)
+            if span is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{st.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+            if span:
+                (start, end), status = span, 206
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or MIME_TYPES.get(fp.suffix.lower(), "application/octet-stream"))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+        for k, v in validators: self.send_header(k, v)
+        self.end_headers()
+        self.write_file(fp, start, end - start + 1)
+        return True
+
+    def write_file(self, fp, offset, count):
+        with open(fp, "rb") as f:
+            self.connection.sendfile(f, offset, count)
 
     def parse_body(self):
-        length = int(self.headers.get("Content-Length", "0"))
+        length = content_length(self.headers.get("Content-Length")) or 0
         data = self.rfile.read(length).decode("utf-8")
         return parse_qs(data)
 
@@ -215,9 +1829,7 @@ class Handler(BaseHTTPRequestHandler):
         raw = self.headers.get("Cookie", "")
         c = cookies.SimpleCookie(); c.load(raw)
         token = c.get("session")
-        if token and token.value in SESSIONS:
-            return SESSIONS[token.value]
-        return None
+        return SESSIONS.get(token.value) if token and token.value else None
 
     def require_auth(self):
         if not self.current_user():
@@ -228,84 +1840,63 @@ class Handler(BaseHTTPRequestHandler):
     def redirect(self, to):
         self.send_response(302)
         self.send_header("Location", to)
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def track(self, path, event_type, post_id=None, value=0):
-        conn = db(); c = conn.cursor()
-        c.execute("INSERT INTO analytics(post_id,path,event_type,value,created_at) VALUES(?,?,?,?,?)", (post_id, path, event_type, value, datetime.utcnow().isoformat()))
-        conn.commit(); conn.close()
+        ANALYTICS.record(post_id, path, event_type, value)
 
     def do_GET(self):
         parsed = urlparse(self.path)
         path = parsed.path
-        query = parse_qs(parsed.query)
 
         if path.startswith('/static/'):
-            fp = STATIC_DIR / path.replace('/static/', '')
-            if fp.exists():
-                ct = 'text/css' if fp.suffix == '.css' else 'application/javascript'
-                self.send_response(200); self.send_header('Content-Type', ct); self.end_headers(); self.wfile.write(fp.read_bytes()); return
+            name = unquote(path[len('/static/'):])
+            if name in ASSET_FILES:
+                if self.send_file(STATIC_DIR, ASSET_FILES[name], IMMUTABLE): return
+            elif self.send_file(STATIC_DIR, name, f"public, max-age={STATIC_MAX_AGE}"): return
         if path.startswith('/uploads/'):
-            fp = UPLOADS_DIR / path.replace('/uploads/', '')
-            if fp.exists():
-                ct = 'image/webp' if fp.suffix == '.webp' else 'application/octet-stream'
-                self.send_response(200); self.send_header('Content-Type', ct); self.end_headers(); self.wfile.write(fp.read_bytes()); return
+            name = unquote(path[len('/uploads/'):])
+            # Content-addressed uploads (and their width variants) never change once written.
+            immutable = re.search(r"-[0-9a-f]{12}(-\d+w)?\.\w+$", name)
+            if self.send_file(UPLOADS_DIR, name, IMMUTABLE if immutable else f"public, max-age={STATIC_MAX_AGE}"): return
 
         if path == '/robots.txt':
-            self.send_response(200); self.send_header('Content-Type', 'text/plain'); self.end_headers(); self.wfile.write(f"User-agent: *\nAllow: /\nSitemap: {BASE_URL}/sitemap.xml\n".encode()); return
-        if path == '/sitemap.xml':
-            conn = db(); posts = conn.execute("SELECT slug, updated_at FROM posts WHERE status='published'").fetchall(); conn.close()
-            items = "".join([f"<url><loc>{BASE_URL}/post/{p['slug']}</loc><lastmod>{p['updated_at']}</lastmod></url>" for p in posts])
-            xml = f"<?xml version='1.0' encoding='UTF-8'?><urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'><url><loc>{BASE_URL}/</loc></url>{items}</urlset>"
-            self.send_response(200); self.send_header('Content-Type', 'application/xml'); self.end_headers(); self.wfile.write(xml.encode()); return
-
-        if path == '/':
-            conn = db()
-            q = query.get('q', [''])[0].strip()
-            sql = "SELECT p.*, c.name AS category_name FROM posts p LEFT JOIN categories c ON c.id=p.category_id WHERE p.status='published'"
-            args = []
-            if q:
-                sql += " AND (p.title LIKE ? OR p.content LIKE ?)"
-                args.extend([f"%{q}%", f"%{q}%"])
-            posts = conn.execute(sql + " ORDER BY datetime(p.published_at) DESC", args).fetchall()
-            cats = conn.execute("SELECT * FROM categories ORDER BY name").fetchall(); conn.close()
-            cards = "".join([f"<article class='card'><a href='/post/{p['slug']}'><h2>{html.escape(p['title'])}</h2></a><p>{html.escape(p['excerpt'] or '')}</p><small>{p['category_name'] or ''} · {p['read_time']} min</small></article>" for p in posts]) or "<p>No hay publicaciones aún.</p>"
-            cats_html = " ".join([f"<a class='chip' href='/category/{c['slug']}'>{c['name']}</a>" for c in cats])
-            body = f"<section><h1>Diario de aprendizaje de chino</h1><form><input name='q' placeholder='Buscar posts...' value='{html.escape(q)}'/><button>Buscar</button></form><div>{cats_html}</div><div class='grid'>{cards}</div></section>"
-            self.track('/', 'pageview')
-            self.send_html(base_layout(APP_NAME, body, 'Blog para aprender mandarín desde cero en español.', f"{BASE_URL}/")); return
-
-        if path.startswith('/post/'):
-            slug = unquote(path.split('/post/', 1)[1])
-            conn = db()
-            post = conn.execute("SELECT p.*, c.name category_name FROM posts p LEFT JOIN categories c ON c.id=p.category_id WHERE p.slug=? AND p.status='published'", (slug,)).fetchone()
-            tags = conn.execute("SELECT t.* FROM tags t JOIN post_tags pt ON pt.tag_id=t.id WHERE pt.post_id=?", (post['id'],)).fetchall() if post else []
-            conn.close()
-            if not post:
-                self.send_html(base_layout("No encontrado", "<h1>Post no encontrado</h1>"), 404); return
-            tag_html = " ".join([f"<a class='chip' href='/tag/{t['slug']}'>#{t['name']}</a>" for t in tags])
-            img = f"<img src='/uploads/{post['featured_image']}' alt='{html.escape(post['featured_image_alt'] or post['title'])}' class='featured'/>" if post['featured_image'] else ''
-            schema = f"<script type='application/ld+json'>{json_ld(post)}</script>"
-            body = f"<article><h1>{html.escape(post['title'])}</h1><p class='meta'>{post['category_name'] or ''} · {post['read_time']} min · {post['published_at'][:10]}</p>{img}<div class='content'>{post['content']}</div><div>{tag_html}</div><section class='author'><h3>Sobre el autor</h3><p>Aprendiz hispanohablante construyendo hábitos de estudio de mandarín.</p></section></article>"
-            self.track(path, 'pageview', post['id'])
-            self.send_html(base_layout(post['meta_title'] or post['title'], body, post['meta_description'] or '', post['canonical_url'] or f"{BASE_URL}{path}", schema)); return
-
-        if path.startswith('/category/') or path.startswith('/tag/'):
-            kind = 'category' if path.startswith('/category/') else 'tag'
-            slug = path.split(f'/{kind}/',1)[1]
-            conn = db()
-            if kind == 'category':
-                entity = conn.execute("SELECT * FROM categories WHERE slug=?", (slug,)).fetchone()
-                posts = conn.execute("SELECT * FROM posts WHERE status='published' AND category_id=?", (entity['id'],)).fetchall() if entity else []
-            else:
-                entity = conn.execute("SELECT * FROM tags WHERE slug=?", (slug,)).fetchone()
-                posts = conn.execute("SELECT p.* FROM posts p JOIN post_tags pt ON pt.post_id=p.id WHERE p.status='published' AND pt.tag_id=?", (entity['id'],)).fetchall() if entity else []
-            conn.close()
-            cards = "".join([f"<article class='card'><a href='/post/{p['slug']}'><h2>{p['title']}</h2></a><p>{p['excerpt'] or ''}</p></article>" for p in posts]) or "<p>Sin resultados.</p>"
-            self.send_html(base_layout(entity['name'] if entity else 'No encontrado', f"<h1>{entity['name'] if entity else 'No encontrado'}</h1>{cards}")); return
+            body = robots_txt().encode()
+            self.send_response(200); self.send_header('Content-Type', 'text/plain'); self.send_header('Content-Length', str(len(body))); self.end_headers(); self.wfile.write(body); return
+        if path == '/sitemap.xml' or re.fullmatch(r"/sitemaps/(pages|posts-\d+)\.xml", path):
+            name = 'index' if path == '/sitemap.xml' else path[len('/sitemaps/'):-len('.xml')]
+            if not (SITEMAP_DIR / 'index.xml.gz').exists():
+                with db() as conn: sitemap_refresh(conn)
+            if accepts_gzip(self.headers.get('Accept-Encoding')):
+                if self.send_file(SITEMAP_DIR, f"{name}.xml.gz", "public, max-age=300", 'application/xml', [('Content-Encoding', 'gzip'), ('Vary', 'Accept-Encoding')]): return
+            elif (SITEMAP_DIR / f"{name}.xml.gz").exists():
+                st = (SITEMAP_DIR / f"{name}.xml.gz").stat()
+                etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}-identity"'  # distinct from the gzip representation's tag
+                validators = [("ETag", etag), ("Last-Modified", formatdate(st.st_mtime, usegmt=True)), ("Cache-Control", "public, max-age=300"), ("Vary", "Accept-Encoding")]
+                if self.not_modified(etag, st.st_mtime):
+                    self.send_response(304)
+                    for k, v in validators: self.send_header(k, v)
+                    self.end_headers(); return
+                xml = gzip.decompress((SITEMAP_DIR / f"{name}.xml.gz").read_bytes())
+                self.send_response(200); self.send_header('Content-Type', 'application/xml'); self.send_header('Content-Length', str(len(xml)))
+                for k, v in validators: self.send_header(k, v)
+                self.end_headers(); self.wfile.write(xml); return
+
+        if path == '/metrics':
+            token = self.headers.get('Authorization', '').encode()
+            if not (self.current_user() or (METRICS_TOKEN and secrets.compare_digest(token, f'Bearer {METRICS_TOKEN}'.encode()))):
+                self.send_response(401); self.send_header('WWW-Authenticate', 'Bearer'); self.send_header('Content-Length', '0'); self.end_headers(); return
+            body = METRICS.prometheus().encode()
+            self.send_response(200); self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'); self.send_header('Content-Length', str(len(body))); self.end_headers()
+            self.wfile.write(body); return
+
+        feed = re.fullmatch(r"(?:/(category|tag)/([^/]+))?/(feed\.xml|atom\.xml|feed\.json)", path)
+        if feed:
+            self.send_feed(feed.group(3), feed.group(1), unquote(feed.group(2) or '') or None); return
 
-        if path == '/about':
-            self.send_html(base_layout("Sobre el autor", "<h1>Hola, soy un estudiante de chino desde cero</h1><p>Este blog documenta estrategias prácticas para hispanohablantes.</p>")); return
+        if is_public_page(path):
+            self.send_page(unquote(path), parsed.query); return
 
         if path == '/admin/login':
             body = """<section class='admin'><h1>Admin Login</h1><form method='post' action='/admin/login'><input name='username' placeholder='Usuario'/><input type='password' name='password' placeholder='Contraseña'/><button>Entrar</button></form></section>"""
@@ -315,25 +1906,22 @@ class Handler(BaseHTTPRequestHandler):
             raw = self.headers.get("Cookie", "")
             c = cookies.SimpleCookie(); c.load(raw)
             token = c.get("session")
-            if token and token.value in SESSIONS: SESSIONS.pop(token.value)
-            self.send_response(302); self.send_header('Location', '/admin/login'); self.send_header('Set-Cookie', 'session=; Path=/; Max-Age=0'); self.end_headers(); return
+            if token and token.value: SESSIONS.delete(token.value)
+            self.send_response(302); self.send_header('Location', '/admin/login'); self.send_header('Set-Cookie', 'session=; Path=/; Max-Age=0'); self.send_header('Content-Length', '0'); self.end_headers(); return
 
         if path == '/admin' or path == '/admin/posts':
             if not self.require_auth(): return
-            conn = db(); posts = conn.execute("SELECT p.*, c.name category_name FROM posts p LEFT JOIN categories c ON c.id=p.category_id ORDER BY datetime(updated_at) DESC").fetchall(); conn.close()
-            rows = ''.join([f"<tr><td>{p['title']}</td><td>{p['status']}</td><td>{p['category_name'] or ''}</td><td><a href='/admin/edit/{p['id']}'>Editar</a></td></tr>" for p in posts])
-            body = f"<section class='admin'><h1>Panel</h1><a href='/admin/new'>+ Nuevo post</a> | <a href='/admin/analytics'>Analytics</a> | <a href='/admin/categories'>Categorías/Tags</a> | <a href='/admin/logout'>Salir</a><table><tr><th>Título</th><th>Estado</th><th>Categoría</th><th></th></tr>{rows}</table></section>"
-            self.send_html(base_layout('Admin', body, ga=False)); return
+            self.send_html(base_layout('Admin', render_admin_posts(parsed.query), ga=False)); return
 
         if path == '/admin/new' or path.startswith('/admin/edit/'):
             if not self.require_auth(): return
             post = None
-            conn = db(); cats = conn.execute("SELECT * FROM categories ORDER BY name").fetchall(); tags = conn.execute("SELECT * FROM tags ORDER BY name").fetchall()
             selected = []
-            if path.startswith('/admin/edit/'):
-                pid = int(path.split('/admin/edit/')[1]); post = conn.execute("SELECT * FROM posts WHERE id=?", (pid,)).fetchone();
-                selected = [r['tag_id'] for r in conn.execute('SELECT tag_id FROM post_tags WHERE post_id=?', (pid,)).fetchall()]
-            conn.close()
+            with db() as conn:
+                cats = conn.execute("SELECT * FROM categories ORDER BY name").fetchall(); tags = conn.execute("SELECT * FROM tags ORDER BY name").fetchall()
+                if path.startswith('/admin/edit/'):
+                    pid = int(path.split('/admin/edit/')[1]); post = conn.execute("SELECT * FROM posts WHERE id=?", (pid,)).fetchone();
+                    selected = [r['tag_id'] for r in conn.execute('SELECT tag_id FROM post_tags WHERE post_id=?', (pid,)).fetchall()]
             opts = ''.join([f"<option value='{c['id']}' {'selected' if post and post['category_id']==c['id'] else ''}>{c['name']}</option>" for c in cats])
             tag_checks = ''.join([f"<label><input type='checkbox' name='tags' value='{t['id']}' {'checked' if t['id'] in selected else ''}/> {t['name']}</label>" for t in tags])
             body = f"""<section class='admin'><h1>{'Editar' if post else 'Nuevo'} post</h1>
@@ -355,25 +1943,38 @@ class Handler(BaseHTTPRequestHandler):
 <label>Estado<select name='status'><option value='draft' {'selected' if not post or post['status']=='draft' else ''}>Draft</option><option value='published' {'selected' if post and post['status']=='published' else ''}>Published</option></select></label>
 <button type='submit'>Guardar</button><button type='button' id='autosave'>Autosave</button>
 </form><div id='seoTips'></div></section>"""
-            self.send_html(base_layout('Editor', body, ga=False, extra_head="<script src='/static/editor.js'></script>")); return
+            self.send_html(base_layout('Editor', body, ga=False, extra_head=f"<script src='{asset_url('editor.js')}'></script>")); return
 
         if path == '/admin/categories':
             if not self.require_auth(): return
-            conn = db(); cats = conn.execute("SELECT * FROM categories").fetchall(); tags = conn.execute("SELECT * FROM tags").fetchall(); conn.close()
+            with db() as conn: cats = conn.execute("SELECT * FROM categories").fetchall(); tags = conn.execute("SELECT * FROM tags").fetchall()
             chtml = ''.join([f"<li>{c['name']}</li>" for c in cats]); thtml = ''.join([f"<li>{t['name']}</li>" for t in tags])
             body = f"<section class='admin'><h1>Categorías y tags</h1><form method='post' action='/admin/category/add'><input name='name' placeholder='Nueva categoría'/><button>Agregar</button></form><ul>{chtml}</ul><form method='post' action='/admin/tag/add'><input name='name' placeholder='Nuevo tag'/><button>Agregar</button></form><ul>{thtml}</ul></section>"
             self.send_html(base_layout('Categorías', body, ga=False)); return
 
         if path == '/admin/analytics':
             if not self.require_auth(): return
-            conn = db()
-            top = conn.execute("SELECT p.title, COUNT(a.id) views FROM analytics a JOIN posts p ON p.id=a.post_id WHERE a.event_type='pageview' GROUP BY p.title ORDER BY views DESC LIMIT 10").fetchall()
-            total = conn.execute("SELECT COUNT(*) c FROM analytics WHERE event_type='pageview'").fetchone()['c']
-            conn.close()
+            with db() as conn:
+                top = conn.execute("SELECT p.title, SUM(d.events) views FROM analytics_daily d JOIN posts p ON p.id=d.post_id WHERE d.event_type='pageview' GROUP BY d.post_id ORDER BY views DESC LIMIT 10").fetchall()
+                total = conn.execute("SELECT COALESCE(SUM(events), 0) c FROM analytics_daily WHERE event_type='pageview'").fetchone()['c']
+                last_day = conn.execute("SELECT COALESCE(SUM(events), 0) c FROM analytics_hourly WHERE event_type='pageview' AND bucket >= ?", ((datetime.utcnow() - timedelta(hours=23)).isoformat()[:13],)).fetchone()['c']
             rows = ''.join([f"<tr><td>{r['title']}</td><td>{r['views']}</td></tr>" for r in top])
-            body = f"<section class='admin'><h1>Analytics</h1><p>Visitas totales: {total}</p><table><tr><th>Post</th><th>Visitas</th></tr>{rows}</table></section>"
+            cache = f"<p>Caché de páginas: {PAGE_CACHE.hits} aciertos · {PAGE_CACHE.misses} fallos · {len(PAGE_CACHE.entries)}/{PAGE_CACHE.size} entradas</p>"
+            body = f"<section class='admin'><h1>Analytics</h1><p>Visitas totales: {total} · últimas 24 h: {last_day}</p>{cache}<table><tr><th>Post</th><th>Visitas</th></tr>{rows}</table></section>"
             self.send_html(base_layout('Analytics', body, ga=False)); return
 
+        if path == '/admin/metrics':
+            if not self.require_auth(): return
+            ms = lambda seconds: f"{seconds * 1000:.1f}"
+            rows = ''.join([f"<tr><td>{html.escape(route)}</td><td>{r['count']}</td><td>{ms(r['sum'] / r['count'])}</td><td>{ms(METRICS.quantile(r, .5))}</td><td>{ms(METRICS.quantile(r, .95))}</td><td>{ms(METRICS.quantile(r, .99))}</td>"
+                            f"<td>{ms(r['db'] / r['count'])}</td><td>{r['queries'] / r['count']:.1f}</td><td>{ms(r['render'] / r['count'])}</td><td>{ms(r['write'] / r['count'])}</td></tr>"
+                            for route, r in sorted(METRICS.snapshot().items(), key=lambda item: -item[1]['sum'])])
+            profiles = ''.join(f"<li><code>{html.escape(fp.name)}</code></li>" for _, fp in sorted(METRICS.slowest or [], reverse=True))
+            profiling = f"<p>Perfilado: {PROFILE_SAMPLE:.1%} de las peticiones; se guardan las {PROFILE_KEEP} más lentas en <code>{PROFILE_DIR}</code> (<code>python3 -m pstats &lt;archivo&gt;</code>).</p><ul>{profiles}</ul>" if PROFILE_SAMPLE else ''
+            body = (f"<section class='admin'><h1>Métricas</h1><p>Tiempos medios y percentiles en ms desde el arranque · <a href='/metrics'>formato Prometheus</a></p>"
+                    f"<table><tr><th>Ruta</th><th>Peticiones</th><th>Media</th><th>p50</th><th>p95</th><th>p99</th><th>DB</th><th>SQL/pet.</th><th>Render</th><th>Escritura</th></tr>{rows}</table>{profiling}</section>")
+            self.send_html(base_layout('Métricas', body, ga=False)); return
+
         self.send_html(base_layout('404', '<h1>No encontrado</h1>'), 404)
 
     def do_POST(self):
@@ -383,17 +1984,19 @@ class Handler(BaseHTTPRequestHandler):
             form = self.parse_body()
             username = form.get('username', [''])[0]
             password = form.get('password', [''])[0]
-            conn = db(); user = conn.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password)).fetchone(); conn.close()
+            with db() as conn: user = conn.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password)).fetchone()
             if not user:
                 self.send_html(base_layout('Login', '<p>Credenciales inválidas</p><a href="/admin/login">Volver</a>', ga=False), 401); return
-            token = secrets.token_hex(24); SESSIONS[token] = username
-            self.send_response(302); self.send_header('Location', '/admin'); self.send_header('Set-Cookie', f'session={token}; Path=/; HttpOnly'); self.end_headers(); return
+            token = SESSIONS.create(username)
+            self.send_response(302); self.send_header('Location', '/admin'); self.send_header('Set-Cookie', f'session={token}; Path=/; Max-Age={SESSION_TTL}; HttpOnly'); self.send_header('Content-Length', '0'); self.end_headers(); return
 
         if path in ['/admin/category/add', '/admin/tag/add']:
             if not self.require_auth(): return
             form = self.parse_body(); name = form.get('name', [''])[0].strip()
             table = 'categories' if 'category' in path else 'tags'
-            conn = db(); conn.execute(f"INSERT OR IGNORE INTO {table}(name, slug) VALUES(?,?)", (name, slugify(name))); conn.commit(); conn.close()
+            with db() as conn: conn.execute(f"INSERT OR IGNORE INTO {table}(name, slug) VALUES(?,?)", (name, slugify(name)))
+            with db() as conn: TAXONOMY.add_term(conn, 'category' if table == 'categories' else 'tag', conn.execute(f"SELECT id, name, slug FROM {table} WHERE slug=?", (slugify(name),)).fetchone())
+            PAGE_CACHE.invalidate({'/', f"/category/{slugify(name)}"} if table == 'categories' else {f"/tag/{slugify(name)}"})
             self.redirect('/admin/categories'); return
 
         if path == '/admin/save':
@@ -406,54 +2009,77 @@ class Handler(BaseHTTPRequestHandler):
             content = data.get('content', '')
             status = data.get('status', 'draft')
             now = datetime.utcnow().isoformat()
+            text = analyze_content(content)
             payload = {
                 'title': title, 'content': content, 'meta_title': data.get('meta_title') or title,
-                'meta_description': data.get('meta_description') or excerpt_from(content),
+                'meta_description': data.get('meta_description') or text['excerpt'],
                 'featured_image_alt': data.get('featured_image_alt') or f"{title} aprendizaje chino",
             }
             if status == 'published':
-                missing = seo_guard(payload)
+                missing = seo_guard(payload, text['outline'])
                 if missing:
                     self.send_html(base_layout('SEO bloqueado', f"<h1>No se puede publicar</h1><p>Faltan: {', '.join(missing)}</p>", ga=False), 422); return
-            conn = db(); c = conn.cursor()
-            if data.get('id'):
-                pid = int(data['id'])
-                c.execute("""UPDATE posts SET title=?, slug=?, content=?, excerpt=?, status=?, category_id=?, featured_image=?, featured_image_alt=?,
-                           meta_title=?, meta_description=?, canonical_url=?, seo_keyword=?, read_time=?, updated_at=?, published_at=COALESCE(published_at,?) WHERE id=?""",
-                          (title, slug, content, data.get('excerpt') or excerpt_from(content), status, data.get('category_id') or None, data.get('featured_image') or None,
-                           payload['featured_image_alt'], payload['meta_title'], payload['meta_description'], data.get('canonical_url') or f"{BASE_URL}/post/{slug}",
-                           data.get('seo_keyword') or '', reading_time_minutes(content), now, now if status == 'published' else None, pid))
-                c.execute('DELETE FROM post_tags WHERE post_id=?', (pid,))
-            else:
-                c.execute("""INSERT INTO posts(title,slug,content,excerpt,status,category_id,featured_image,featured_image_alt,meta_title,meta_description,canonical_url,seo_keyword,read_time,created_at,updated_at,published_at)
-                          VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                          (title, slug, content, data.get('excerpt') or excerpt_from(content), status, data.get('category_id') or None, data.get('featured_image') or None,
-                           payload['featured_image_alt'], payload['meta_title'], payload['meta_description'], data.get('canonical_url') or f"{BASE_URL}/post/{slug}",
-                           data.get('seo_keyword') or '', reading_time_minutes(content), now, now, now if status == 'published' else None))
-                pid = c.lastrowid
-            for tid in tags:
-                c.execute('INSERT OR IGNORE INTO post_tags(post_id, tag_id) VALUES(?,?)', (pid, tid))
-            conn.commit(); conn.close()
+            with db() as conn:
+                c = conn.cursor()
+                stale = {'/'}
+                if data.get('id'):
+                    pid = int(data['id'])
+                    stale |= post_paths(conn, pid)
+                    c.execute("""UPDATE posts SET title=?, slug=?, content=?, excerpt=?, status=?, category_id=?, featured_image=?, featured_image_alt=?,
+                               meta_title=?, meta_description=?, canonical_url=?, seo_keyword=?, read_time=?, updated_at=?, published_at=COALESCE(published_at,?) WHERE id=?""",
+                              (title, slug, content, data.get('excerpt') or text['excerpt'], status, data.get('category_id') or None, data.get('featured_image') or None,
+                               payload['featured_image_alt'], payload['meta_title'], payload['meta_description'], data.get('canonical_url') or f"{BASE_URL}/post/{slug}",
+                               data.get('seo_keyword') or '', text['read_time'], now, now if status == 'published' else None, pid))
+                    c.execute('DELETE FROM post_tags WHERE post_id=?', (pid,))
+                else:
+                    c.execute("""INSERT INTO posts(title,slug,content,excerpt,status,category_id,featured_image,featured_image_alt,meta_title,meta_description,canonical_url,seo_keyword,read_time,created_at,updated_at,published_at)
+                              VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                              (title, slug, content, data.get('excerpt') or text['excerpt'], status, data.get('category_id') or None, data.get('featured_image') or None,
+                               payload['featured_image_alt'], payload['meta_title'], payload['meta_description'], data.get('canonical_url') or f"{BASE_URL}/post/{slug}",
+                               data.get('seo_keyword') or '', text['read_time'], now, now, now if status == 'published' else None))
+                    pid = c.lastrowid
+                for tid in tags:
+                    c.execute('INSERT OR IGNORE INTO post_tags(post_id, tag_id) VALUES(?,?)', (pid, tid))
+                stale |= post_paths(conn, pid)
+                store_derived(conn, pid, text)
+                if FTS_ENABLED:
+                    fts_index_post(conn, pid)
+            with db() as conn: stale |= TAXONOMY.update(conn, pid); sitemap_refresh(conn, [pid])
+            PAGE_CACHE.invalidate(stale)
             self.redirect('/admin/posts'); return
 
         if path == '/admin/upload-image':
             if not self.require_auth(): return
-            length = int(self.headers.get('Content-Length', '0'))
-            raw = self.rfile.read(length)
-            name = self.headers.get('X-File-Name', f'image-{int(time.time())}.webp')
-            safe = slugify(Path(name).stem) + '.webp'
-            (UPLOADS_DIR / safe).write_bytes(raw)
-            self.send_json({'filename': safe}); return
+            length = content_length(self.headers.get('Content-Length'))
+            if length is None:
+                self.send_json({'error': 'Falta Content-Length'}, 411); return
+            if length > MAX_UPLOAD_BYTES:
+                self.send_json({'error': f'La imagen supera {MAX_UPLOAD_BYTES // (1024 * 1024)} MB'}, 413); return
+            try:
+                filename = store_upload(self.rfile, length, self.headers.get('X-File-Name', f'image-{int(time.time())}.webp'))
+            except ValueError as e:
+                self.send_json({'error': str(e)}, 400); return
+            self.send_json({'filename': filename}); return
 
         self.send_json({'error': 'Not found'}, 404)
 
 
+def register_assets():
+    ASSETS.clear(); ASSET_FILES.clear()
+    for fp in sorted(STATIC_DIR.iterdir()):
+        if fp.is_file():
+            hashed = f"{fp.stem}.{hashlib.sha1(fp.read_bytes()).hexdigest()[:10]}{fp.suffix}"
+            ASSETS[fp.name] = hashed
+            ASSET_FILES[hashed] = fp.name
+
+
 def write_static():
     (STATIC_DIR / 'style.css').write_text("""
 :root{--bg:#f7f7f5;--fg:#1f2428;--muted:#666;--card:#fff;--accent:#2d5a88}html[data-theme='dark']{--bg:#17191c;--fg:#eceff1;--muted:#a5aab0;--card:#202329;--accent:#8ab4f8}
 *{box-sizing:border-box}body{font-family:Inter,system-ui,sans-serif;background:var(--bg);color:var(--fg);margin:0;line-height:1.7}.site-header{position:sticky;top:0;display:flex;justify-content:space-between;padding:1rem 1.5rem;background:var(--bg);border-bottom:1px solid #ddd}.logo{text-decoration:none;color:var(--fg);font-weight:700}
 main{max-width:860px;margin:0 auto;padding:1rem}footer{text-align:center;color:var(--muted);padding:2rem}.grid{display:grid;gap:1rem}.card{background:var(--card);padding:1rem;border-radius:12px}.chip{display:inline-block;padding:.2rem .6rem;background:var(--card);border-radius:999px;text-decoration:none;color:var(--accent);margin:.25rem 0}
-input,textarea,select,button{width:100%;padding:.7rem;margin:.3rem 0;border-radius:8px;border:1px solid #ccc;background:var(--card);color:var(--fg)}button{cursor:pointer}.admin label{display:block}.tag-grid{display:flex;gap:.8rem;flex-wrap:wrap}.editor{min-height:260px;border:1px solid #ccc;border-radius:8px;padding:1rem;background:var(--card)}table{width:100%;border-collapse:collapse}td,th{border:1px solid #ccc;padding:.5rem}.featured{width:100%;border-radius:12px}
+input,textarea,select,button{width:100%;padding:.7rem;margin:.3rem 0;border-radius:8px;border:1px solid #ccc;background:var(--card);color:var(--fg)}button{cursor:pointer}.admin label{display:block}.tag-grid{display:flex;gap:.8rem;flex-wrap:wrap}.editor{min-height:260px;border:1px solid #ccc;border-radius:8px;padding:1rem;background:var(--card)}table{width:100%;border-collapse:collapse}td,th{border:1px solid #ccc;padding:.5rem}.featured{width:100%;height:auto;border-radius:12px}
+mark{background:#fde68a;color:inherit;border-radius:3px}.pager{display:flex;justify-content:space-between;margin:1rem 0}
 @media(max-width:700px){.site-header nav{display:flex;gap:.5rem;align-items:center}.site-header{padding:.75rem}}
 """)
     (STATIC_DIR / 'app.js').write_text("""
@@ -477,16 +2103,762 @@ if(form){
   editor.addEventListener('input', suggest); suggest();
   document.getElementById('autosave')?.addEventListener('click',()=>{contentInput.value=editor.innerHTML; localStorage.setItem('draft_'+(slugInput.value||'new'), JSON.stringify(Object.fromEntries(new FormData(form)))); alert('Borrador guardado en navegador');});
   const key='draft_'+(slugInput.value||'new'); const draft=localStorage.getItem(key); if(draft && !form.querySelector('input[name="id"]').value){const d=JSON.parse(draft); for(const [k,v] of Object.entries(d)){const el=form.querySelector(`[name="${k}"]`); if(el) el.value=v;} if(d.content) editor.innerHTML=d.content;}
-  featured?.addEventListener('change', async (e)=>{const file=e.target.files[0]; if(!file) return; const img=await createImageBitmap(file); const canvas=document.createElement('canvas'); canvas.width=img.width; canvas.height=img.height; const ctx=canvas.getContext('2d'); ctx.drawImage(img,0,0); canvas.toBlob(async(blob)=>{const seoName=(slugInput.value||titleInput.value||'image').toLowerCase().replace(/\s+/g,'-')+'.webp'; const res=await fetch('/admin/upload-image',{method:'POST',headers:{'X-File-Name':seoName},body:blob}); const j=await res.json(); hiddenImage.value=j.filename; const alt=form.querySelector('input[name="featured_image_alt"]'); if(!alt.value){alt.value='Imagen destacada: '+(titleInput.value||'aprendizaje de chino');} }, 'image/webp', 0.8);
+  featured?.addEventListener('change', async (e)=>{const file=e.target.files[0]; if(!file) return; const img=await createImageBitmap(file); const canvas=document.createElement('canvas'); canvas.width=img.width; canvas.height=img.height; const ctx=canvas.getContext('2d'); ctx.drawImage(img,0,0); canvas.toBlob(async(blob)=>{const seoName=(slugInput.value||titleInput.value||'image').toLowerCase().replace(/\s+/g,'-')+'.webp'; const res=await fetch('/admin/upload-image',{method:'POST',headers:{'X-File-Name':seoName},body:blob}); const j=await res.json(); if(!res.ok){alert(j.error||'No se pudo subir la imagen'); return;} hiddenImage.value=j.filename; const alt=form.querySelector('input[name="featured_image_alt"]'); if(!alt.value){alt.value='Imagen destacada: '+(titleInput.value||'aprendizaje de chino');} }, 'image/webp', 0.8);
   });
 }
 """)
+    register_assets()
+
+
+class BufferedHandler(Handler):
+    """Handler run on one request already read off the socket into a file; the response is collected instead of written to a socket."""
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, rfile, client_address):
+        self.rfile = rfile
+        self.wfile = io.BytesIO()
+        self.client_address = client_address
+        self.connection = None
+        self.server = None
+        self.file_body = None
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+        except Exception:
+            traceback.print_exc()
+            self.wfile = io.BytesIO(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            self.file_body, self.close_connection = None, True
+
+    def handle_expect_100(self):
+        return True  # the engine already answered 100 Continue before reading the body
+
+    def write_file(self, fp, offset, count):
+        self.file_body = (fp, offset, count)  # sent by the event loop with loop.sendfile()
+
+
+def request_head(head):
+    """Lower-cased headers of a raw request head (request line excluded)."""
+    headers = {}
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def read_body(reader, length, spool):
+    # READ_TIMEOUT applies to each chunk, so slow but steady uploads still complete.
+    while length:
+        chunk = await asyncio.wait_for(reader.read(min(length, 64 * 1024)), READ_TIMEOUT)
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", length)
+        spool.write(chunk)
+        length -= len(chunk)
+
+
+async def handle_connection(reader, writer, executors, admission, handler_class):
+    # Requests on one connection are answered strictly in order, so pipelined requests just queue in the reader.
+    loop = asyncio.get_running_loop()
+    peer = writer.get_extra_info("peername") or ("", 0)
+    idle = READ_TIMEOUT  # the first head must arrive within READ_TIMEOUT; later ones may idle up to KEEPALIVE_TIMEOUT
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), idle)
+            except asyncio.LimitOverrunError:
+                writer.write(closing_response(431, ""))
+                break
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                break
+            idle = KEEPALIVE_TIMEOUT
+            target = head.split(b"\r\n", 1)[0].split(b" ")
+            path = urlparse(target[1].decode("latin-1")).path if len(target) > 1 else ""
+            headers = request_head(head)
+            length = content_length(headers.get("content-length")) or 0  # an invalid value is refused by the handler
+            if length > body_limit(path):
+                writer.write(closing_response(413, path))
+                break
+            admin = is_admin_path(path)
+            if not admission.enter(admin):
+                METRICS.shed_request('busy')
+                writer.write(closing_response(503, path))
+                break
+            # Form posts stay in memory; uploads spill to a temp file so they stream to disk as on the threading engine.
+            spool = tempfile.SpooledTemporaryFile(max_size=64 * 1024 + MAX_BODY_BYTES)
+            try:
+                spool.write(head)
+                complete = "transfer-encoding" not in headers
+                if complete and length:
+                    if headers.get("expect", "").lower() == "100-continue":
+                        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    await read_body(reader, length, spool)
+                spool.seek(0)
+                handler = await loop.run_in_executor(executors[admin], handler_class, spool, peer)
+            finally:
+                admission.leave(admin)
+                spool.close()
+            writer.write(handler.wfile.getvalue())
+            if handler.file_body:
+                fp, offset, count = handler.file_body
+                await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+                with open(fp, "rb") as f:
+                    # WRITE_TIMEOUT per 1 MiB, like each drain(): a stalled reader is dropped, a slow steady one is not.
+                    for start in range(offset, offset + count, 1024 * 1024):
+                        await asyncio.wait_for(loop.sendfile(writer.transport, f, start, min(1024 * 1024, offset + count - start)), WRITE_TIMEOUT)
+            await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+            if handler.close_connection or not complete:
+                break  # an unread body would be parsed as the next request
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_async(host, port, handler_class=BufferedHandler, ready=None, sock=None):
+    """asyncio engine: the loop owns the sockets and keep-alive, route logic runs on ASYNC_WORKERS threads (admin on its own pool)."""
+    executors = {False: ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="http"),
+                 True: ThreadPoolExecutor(max_workers=max(1, ADMIN_WORKERS), thread_name_prefix="http-admin")}
+    admission = Admission(ASYNC_WORKERS + ACCEPT_QUEUE)  # running plus waiting for a worker thread
+    address = {"sock": sock} if sock else {"host": host, "port": port}
+    server = await asyncio.start_server(lambda r, w: handle_connection(r, w, executors, admission, handler_class), limit=64 * 1024, **address)
+    if ready:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+
+
+class BoundedHTTPServer(ThreadingHTTPServer):
+    """Threading engine with HTTP_WORKERS threads fed with connections whose request head has fully arrived.
+
+    A triage thread collects request heads without blocking, so a slow client never holds a worker and the lane of every
+    request is known from its request line. Each lane has its own queue and threads: ADMIN_WORKERS serve only admin
+    requests, the rest only public ones, which wait in a queue of up to ACCEPT_QUEUE connections and get 503 beyond it.
+    Heads still incomplete after READ_TIMEOUT get 408.
+    """
+
+    request_queue_size = 1024
+    max_head_bytes = 65536  # larger heads go to the Handler as they are and are refused there
+
+    def __init__(self, address, handler_class, bind_and_activate=True, workers=HTTP_WORKERS):
+        super().__init__(address, handler_class, bind_and_activate)
+        self.lanes = {False: queue.Queue(), True: queue.Queue()}  # keyed by is-admin
+        self.heads = {}  # socket -> head bytes read by triage, picked up by Handler.setup
+        self.arrivals = queue.SimpleQueue()
+        self.selector = selectors.DefaultSelector()
+        self.wakeup, self.waker = socket.socketpair()
+        self.wakeup.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+        self.undecided = {}  # socket -> (client address, head so far, deadline); only touched by the triage thread
+        self.running = True
+        self.admin_workers = max(1, min(ADMIN_WORKERS, workers - 1))
+        self.workers = [threading.Thread(target=self.work, args=(n < self.admin_workers,), name=f"http-{n}", daemon=True) for n in range(max(2, workers))]
+        for t in self.workers + [threading.Thread(target=self.triage, name="http-triage", daemon=True)]:
+            t.start()
+
+    def receive(self, request, head):
+        """Append whatever the client has sent so far without blocking; False once it hung up."""
+        try:
+            while len(head) < self.max_head_bytes and b"\r\n\r\n" not in head and b"\n\n" not in head:
+                data = request.recv(65536, socket.MSG_DONTWAIT)
+                if not data:
+                    return False
+                head += data
+        except BlockingIOError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    def complete(self, head):
+        return len(head) >= self.max_head_bytes or b"\r\n\r\n" in head or b"\n\n" in head
+
+    def dispatch(self, request, client_address, head):
+        parts = bytes(head).split(b"\n", 1)[0].split(b" ", 2)
+        admin = len(parts) > 1 and is_admin_path(urlparse(parts[1].decode("latin-1")).path)
+        if admin or self.lanes[False].qsize() < ACCEPT_QUEUE:
+            self.heads[request] = bytes(head)
+            self.lanes[admin].put((request, client_address))
+            return
+        METRICS.shed_request('queue')
+        self.refuse(request, 503)
+
+    def refuse(self, request, code):
+        try:
+            request.send(closing_response(code, "", "HTTP/1.0"), socket.MSG_DONTWAIT)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        # Most clients send the request with the connection; only the rest wait in triage.
+        head = bytearray()
+        if not self.receive(request, head):
+            self.shutdown_request(request)
+        elif self.complete(head):
+            self.dispatch(request, client_address, head)
+        else:
+            self.arrivals.put((request, client_address, head, time.monotonic() + READ_TIMEOUT))
+            self.waker.send(b"\0")
+
+    def triage(self):
+        while self.running:
+            deadline = min((d for _c, _h, d in self.undecided.values()), default=None)
+            ready = self.selector.select(None if deadline is None else max(0, deadline - time.monotonic()))
+            for key, _ in ready:
+                request = key.fileobj
+                if request is self.wakeup:
+                    try:
+                        while self.wakeup.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                client_address, head, _deadline = self.undecided[request]
+                alive = self.receive(request, head)
+                if alive and not self.complete(head):
+                    continue
+                self.selector.unregister(request)
+                del self.undecided[request]
+                if alive:
+                    self.dispatch(request, client_address, head)
+                else:
+                    self.shutdown_request(request)
+            while True:
+                try:
+                    request, client_address, head, deadline = self.arrivals.get_nowait()
+                except queue.Empty:
+                    break
+                self.undecided[request] = (client_address, head, deadline)
+                self.selector.register(request, selectors.EVENT_READ)
+            now = time.monotonic()
+            for request in [r for r, (_c, _h, d) in self.undecided.items() if d <= now]:
+                self.selector.unregister(request)
+                del self.undecided[request]
+                self.refuse(request, 408)
+
+    def work(self, admin):
+        while True:
+            request, client_address = self.lanes[admin].get()
+            if request is None:
+                return
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.running = False
+        self.waker.send(b"\0")
+        for n in range(len(self.workers)):
+            self.lanes[n < self.admin_workers].put((None, None))
+
+
+def run_server(port, sock=None):
+    """Run the configured engine until SIGTERM/Ctrl-C, on a fresh socket or an inherited listening one."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        if SERVER_ENGINE == 'asyncio':
+            asyncio.run(serve_async('0.0.0.0', port, sock=sock))
+            return
+        server = BoundedHTTPServer(('0.0.0.0', port), Handler, bind_and_activate=sock is None)
+        if sock:
+            server.socket.close()
+            server.socket = sock
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ANALYTICS.stop()
+
+
+def supervise(sock, workers):
+    """Prefork: fork workers that accept on the shared socket, restart any that die, forward SIGTERM on shutdown."""
+    children, stopping = {}, False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            status = 1
+            try:
+                run_server(sock.getsockname()[1], sock)
+                status = 0
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush(); sys.stderr.flush()
+                os._exit(status)
+        children[pid] = time.monotonic()
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting", file=sys.stderr)
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # crash loop: don't fork-bomb the box
+        spawn()
+
+
+def serve():
+    port = int(os.getenv('PORT', '8000'))
+    print(f"Running on http://localhost:{port} ({SERVER_ENGINE}, {WORKERS} worker{'s' if WORKERS > 1 else ''})")
+    with db() as conn: sitemap_refresh(conn)
+    PAGE_CACHE.stamp, TAXONOMY.stamp = CONTENT_STAMP, TAXONOMY_STAMP  # also lets `import` notify a running server
+    if WORKERS <= 1:
+        run_server(port)
+        return
+    sock = socket.create_server(('0.0.0.0', port), backlog=1024)
+    sock.setblocking(False)  # workers race for accept(); the losers just go back to select()
+    POOL.close_all()  # SQLite connections must not cross fork()
+    SESSIONS.stamp = DATA_DIR / "sessions.stamp"
+    supervise(sock, WORKERS)
+
+
+def reindex():
+    if not FTS_ENABLED:
+        print("SQLite was built without FTS5; nothing to index")
+        return
+    with db() as conn: n = fts_rebuild(conn)
+    print(f"Search index rebuilt: {n} posts")
+
+
+def derive(everything=False):
+    with db() as conn: n = backfill_derived(conn, everything)
+    print(f"Derived fields rewritten for {n} posts (version {DERIVED_VERSION})")
+
+
+# Columns carried by `app.py import` / `app.py export`; category and tags travel as names.
+CONTENT_FIELDS = ["title", "slug", "content", "excerpt", "status", "featured_image", "featured_image_alt", "meta_title", "meta_description",
+                  "canonical_url", "seo_keyword", "author_name", "created_at", "updated_at", "published_at"]
+
+
+def md_inline(text):
+    text = html.escape(text, quote=False)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![*\w])[*_](.+?)[*_](?![*\w])", r"<em>\1</em>", text)
+    text = re.sub(r"!\[([^\]]*)\]\(([^)\s]+)\)", r"<img src='\2' alt='\1'/>", text)
+    return re.sub(r"\[([^\]]+)\]\(([^)\s]+)\)", r"<a href='\2'>\1</a>", text)
+
+
+def markdown_to_html(text):
+    """Markdown to HTML via the markdown package if installed, else headings, paragraphs, lists, quotes and inline markup."""
+    if markdown is not None:
+        return markdown.markdown(text)
+    out, para, items = [], [], []
+
+    def flush():
+        if para:
+            out.append(f"<p>{' '.join(para)}</p>"); para.clear()
+        if items:
+            out.append(f"<{items[0]}>{''.join(f'<li>{i}</li>' for i in items[1:])}</{items[0]}>"); items.clear()
+
+    for line in text.splitlines():
+        line = line.strip()
+        heading = re.match(r"(#{1,6})\s+(.+?)\s*#*$", line)
+        item = re.match(r"([-*+]|\d+[.)])\s+(.*)", line)
+        if not line:
+            flush()
+        elif line.startswith("<") and not para:
+            flush(); out.append(line)  # raw HTML passes through
+        elif heading:
+            flush(); out.append(f"<h{len(heading[1])}>{md_inline(heading[2])}</h{len(heading[1])}>")
+        elif item:
+            kind = "ol" if item[1][0].isdigit() else "ul"
+            if para or (items and items[0] != kind):
+                flush()
+            items[:] = items or [kind]
+            items.append(md_inline(item[2]))
+        elif line.startswith(">"):
+            flush(); out.append(f"<blockquote><p>{md_inline(line.lstrip('> '))}</p></blockquote>")
+        else:
+            if items:
+                flush()
+            para.append(md_inline(line))
+    flush()
+    return "\n".join(out)
+
+
+def parse_front_matter(text):
+    """Split `---` front matter (flat `key: value` lines, JSON/YAML-flow values, `- item` lists) from the body."""
+    if not text.startswith("---"):
+        return {}, text
+    head, _, body = text[3:].partition("\n---")
+    meta, key = {}, None
+    for line in head.splitlines():
+        if line.strip().startswith("- ") and key:
+            meta[key] = (meta[key] if isinstance(meta[key], list) else []) + [line.strip()[2:].strip().strip("'\"")]
+        elif ":" in line:
+            key, _, value = line.partition(":")
+            key, value = key.strip(), value.strip()
+            try:
+                meta[key] = json.loads(value) if value else None  # becomes a list if `- item` lines follow
+            except ValueError:
+                meta[key] = [v.strip().strip("'\"") for v in value[1:-1].split(",") if v.strip()] if value.startswith("[") else value.strip("'\"")
+    body = body.partition("\n")[2]
+    body = body[1:] if body.startswith("\n") else body
+    return meta, body[:-1] if body.endswith("\n") else body  # export writes one blank line before and one newline after
+
+
+def content_records(path, fmt):
+    """Stream import records from a JSONL file ('-' = stdin) or from Markdown files (one file or a directory of *.md)."""
+    if fmt == 'jsonl':
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        with f:
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield f"{path}:{n}", json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield f"{path}:{n}", ValueError(f"invalid JSON, {e.msg.lower()} at column {e.pos + 1}")
+        return
+    files = sorted(Path(path).glob('*.md')) if Path(path).is_dir() else [Path(path)]
+    for fp in files:
+        try:
+            meta, body = parse_front_matter(fp.read_text(encoding='utf-8'))
+        except UnicodeDecodeError:
+            yield str(fp), ValueError("not UTF-8 text"); continue
+        meta.setdefault('slug', fp.stem)
+        meta['content'] = body if str(meta.pop('format', 'markdown')).lower() == 'html' else markdown_to_html(body)
+        yield str(fp), meta
+
+
+def clean_record(record):
+    """Check one import record and coerce its fields in place; returns why it has to be skipped, or None."""
+    if isinstance(record, ValueError):
+        return str(record)
+    if not isinstance(record, dict):
+        return "expected an object"
+    scalar = lambda v: isinstance(v, (str, int, float)) and not isinstance(v, bool)
+    for key in CONTENT_FIELDS + ['category']:
+        value = record.get(key)
+        if value is not None and not scalar(value):
+            return f"'{key}' must be text"
+        if value is not None:
+            record[key] = str(value)
+    tags = record.get('tags')
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    if tags is not None:
+        if not isinstance(tags, list) or not all(scalar(t) for t in tags):
+            return "'tags' must be a list of names"
+        record['tags'] = [str(t).strip() for t in tags if str(t).strip()]
+    if record.get('status') not in (None, '', 'draft', 'published'):
+        return f"unknown status '{record['status']}'"
+    if not record.get('title') or not record.get('content'):
+        return "title and content are required"
+    return None
+
+
+def import_values(r, category_id, now):
+    """posts column values for one record, filling blanks with the same defaults as the admin editor."""
+    status = r.get('status') or 'draft'
+    updated = r.get('updated_at') or now
+    return (r['title'], r['slug'], r['content'], r.get('excerpt') or excerpt_from(r['content']), status, category_id, r.get('featured_image') or None,
+            r.get('featured_image_alt') or f"{r['title']} aprendizaje chino", r.get('meta_title') or r['title'],
+            r.get('meta_description') or excerpt_from(r['content']), r.get('canonical_url') or f"{BASE_URL}/post/{r['slug']}",
+            r.get('seo_keyword') or '', reading_time_minutes(r['content']), r.get('author_name') or 'Admin',
+            r.get('created_at') or updated, updated, r.get('published_at') or (updated if status == 'published' else None))
+
+
+def import_batch(conn, records):
+    """Upsert one batch of records by slug in the caller's transaction; returns (inserted, updated)."""
+    now = datetime.utcnow().isoformat()
+    names = {slugify(r['category']): r['category'] for r in records if r.get('category')}
+    conn.executemany("INSERT OR IGNORE INTO categories(name, slug) VALUES(?,?)", [(name, slug) for slug, name in names.items()])
+    tag_names = {slugify(t): t for r in records for t in r.get('tags') or []}
+    conn.executemany("INSERT OR IGNORE INTO tags(name, slug) VALUES(?,?)", [(name, slug) for slug, name in tag_names.items()])
+    marks = lambda items: ",".join("?" * len(items))
+    categories = {r['slug']: r['id'] for r in conn.execute(f"SELECT id, slug FROM categories WHERE slug IN ({marks(names)})", list(names))} if names else {}
+    tags = {r['slug']: r['id'] for r in conn.execute(f"SELECT id, slug FROM tags WHERE slug IN ({marks(tag_names)})", list(tag_names))} if tag_names else {}
+    # slugify() drops hanzi, so '汉字' and '拼音' both become 'post': say so instead of silently merging them.
+    for kind, table, given in (('category', 'categories', [r['category'] for r in records if r.get('category')]),
+                               ('tag', 'tags', [t for r in records for t in r.get('tags') or []])):
+        by_slug = {}
+        for name in given:
+            by_slug.setdefault(slugify(name), set()).add(name)
+        stored = {r['slug']: r['name'] for r in conn.execute(f"SELECT slug, name FROM {table} WHERE slug IN ({marks(by_slug)})", list(by_slug))} if by_slug else {}
+        for slug, merged in by_slug.items():
+            for name in sorted(merged - {stored.get(slug)}):
+                print(f"{kind} '{name}' merged into '{stored.get(slug)}' (same slug '{slug}')", file=sys.stderr)
+    slugs = [r['slug'] for r in records]
+    # Both sides get the defaults before comparing, so re-importing an export whose rows hold NULLs counts as unchanged;
+    # unchanged rows are not written, which keeps updated_at (and sitemap lastmod) as they were.
+    compared = lambda values: values[:12] + values[13:14]  # everything but read_time and the dates
+    current = {row['slug']: compared(import_values(dict(row), row['category_id'], row['updated_at']))
+               for row in conn.execute(f"SELECT {', '.join(CONTENT_FIELDS)}, category_id FROM posts WHERE slug IN ({marks(slugs)})", slugs)}
+    rows = []
+    for r in records:
+        values = import_values(r, categories.get(slugify(r['category'])) if r.get('category') else None, now)
+        if current.get(r['slug']) != compared(values):
+            rows.append(values)
+    conn.executemany("""INSERT INTO posts(title,slug,content,excerpt,status,category_id,featured_image,featured_image_alt,meta_title,meta_description,canonical_url,seo_keyword,read_time,author_name,created_at,updated_at,published_at)
+                        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+                        ON CONFLICT(slug) DO UPDATE SET title=excluded.title, content=excluded.content, excerpt=excluded.excerpt, status=excluded.status,
+                            category_id=excluded.category_id, featured_image=excluded.featured_image, featured_image_alt=excluded.featured_image_alt,
+                            meta_title=excluded.meta_title, meta_description=excluded.meta_description, canonical_url=excluded.canonical_url,
+                            seo_keyword=excluded.seo_keyword, read_time=excluded.read_time, author_name=excluded.author_name,
+                            updated_at=excluded.updated_at, published_at=COALESCE(posts.published_at, excluded.published_at)""", rows)
+    ids = {r['slug']: r['id'] for r in conn.execute(f"SELECT id, slug FROM posts WHERE slug IN ({marks(slugs)})", slugs)}
+    wanted = {ids[r['slug']]: {tags[slugify(t)] for t in r['tags'] or []} for r in records if 'tags' in r}
+    held = {}
+    for pid, tid in conn.execute(f"SELECT post_id, tag_id FROM post_tags WHERE post_id IN ({marks(wanted)})", list(wanted)) if wanted else ():
+        held.setdefault(pid, set()).add(tid)
+    retagged = [pid for pid, tids in wanted.items() if held.get(pid, set()) != tids]
+    conn.executemany("DELETE FROM post_tags WHERE post_id=?", [(pid,) for pid in retagged])
+    conn.executemany("INSERT OR IGNORE INTO post_tags(post_id, tag_id) VALUES(?,?)", [(pid, tid) for pid in retagged for tid in wanted[pid]])
+    # Derived columns and the FTS row only change with the post or its tags; unchanged records are left alone.
+    for pid in sorted({ids[values[1]] for values in rows} | set(retagged)):
+        store_derived(conn, pid)
+        if FTS_ENABLED:
+            fts_index_post(conn, pid)
+    inserted = len(set(slugs) - set(current))
+    return inserted, len(rows) - inserted
+
+
+def import_content(path, fmt, batch_size=500):
+    started, seen, batch = time.monotonic(), set(), []
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    with db() as conn:
+        def flush():
+            inserted, updated = import_batch(conn, batch)
+            conn.commit()
+            totals['inserted'] += inserted; totals['updated'] += updated; totals['unchanged'] += len(batch) - inserted - updated
+            batch.clear()
+
+        for where, record in content_records(path, fmt):
+            problem = clean_record(record)
+            if problem:
+                print(f"{where}: skipped, {problem}", file=sys.stderr); totals['skipped'] += 1; continue
+            record['slug'] = slugify(record.get('slug') or record['title'])
+            if record['slug'] in seen:
+                print(f"{where}: skipped, duplicate slug '{record['slug']}'", file=sys.stderr); totals['skipped'] += 1; continue
+            seen.add(record['slug'])
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        sitemap_refresh(conn)
+    for stamp in (CONTENT_STAMP, TAXONOMY_STAMP):
+        if stamp.exists():
+            stamp.touch()
+    print(f"Imported {len(seen)} posts in {time.monotonic() - started:.1f}s: {totals['inserted']} new, {totals['updated']} updated, "
+          f"{totals['unchanged']} unchanged, {totals['skipped']} skipped")
+
+
+def export_content(path, fmt, status=None):
+    """Stream posts out as JSONL (path '-' = stdout) or as one Markdown file with front matter per post."""
+    query = f"""SELECT {', '.join('p.' + f for f in CONTENT_FIELDS)}, c.name category,
+                (SELECT json_group_array(t.name) FROM tags t JOIN post_tags pt ON pt.tag_id=t.id WHERE pt.post_id=p.id) tags
+                FROM posts p LEFT JOIN categories c ON c.id=p.category_id {'WHERE p.status=?' if status else ''} ORDER BY p.id"""
+    n = 0
+    with db() as conn:
+        if fmt == 'jsonl':
+            f = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+            try:
+                for row in conn.execute(query, (status,) if status else ()):
+                    f.write(json.dumps({**dict(row), 'tags': json.loads(row['tags'])}, ensure_ascii=False) + "\n"); n += 1
+            finally:
+                if f is not sys.stdout:
+                    f.close()
+        else:
+            out = Path(path)
+            out.mkdir(parents=True, exist_ok=True)
+            for row in conn.execute(query, (status,) if status else ()):
+                meta = {k: row[k] for k in CONTENT_FIELDS if k != 'content' and row[k] is not None}
+                meta.update(category=row['category'], tags=json.loads(row['tags']), format='html')
+                head = "".join(f"{k}: {json.dumps(v, ensure_ascii=False)}\n" for k, v in meta.items() if v is not None)
+                (out / f"{row['slug']}.md").write_text(f"---\n{head}---\n\n{row['content']}\n", encoding='utf-8'); n += 1
+    print(f"Exported {n} posts", file=sys.stderr)
+
+
+def write_if_changed(fp, data):
+    if fp.exists() and fp.read_bytes() == data:
+        return False
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    fp.write_bytes(data)
+    return True
+
+
+def export_posts(out, slugs):
+    for slug in slugs:
+        _status, page, _pid = render_post(slug)
+        write_if_changed(out / 'post' / slug / 'index.html', page.encode('utf-8'))
+    return len(slugs)
+
+
+def listing_cursors(**where):
+    cursors = [None]
+    while True:
+        _rows, next_cursor = TAXONOMY.page(cursors[-1], **where)
+        if not next_cursor:
+            return cursors
+        cursors.append(parse_cursor(next_cursor))
+
+
+def export_listing(out, base, cursors, render):
+    written = []
+    for n, cursor in enumerate(cursors, start=1):
+        older = f"{base}page/{n + 1}/" if n < len(cursors) else None
+        _status, page, _pid = render(cursor, older)
+        rel = Path(base.strip('/')) / ('' if n == 1 else f"page/{n}") / 'index.html'
+        write_if_changed(out / rel, page.encode('utf-8'))
+        written.append(rel.as_posix())
+    return written
+
+
+def mirror_dir(src, dest, aliases=None):
+    # Copies changed files (size/mtime) from src, plus a copy under each alias name, and prunes the rest.
+    dest.mkdir(parents=True, exist_ok=True)
+    keep = set()
+    for fp in [p for p in src.iterdir() if p.is_file()]:
+        st = fp.stat()
+        for name in filter(None, [fp.name, (aliases or {}).get(fp.name)]):
+            target = dest / name
+            if not target.exists() or (target.stat().st_size, target.stat().st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                shutil.copy2(fp, target)
+            keep.add(name)
+    for fp in dest.iterdir():
+        if fp.is_file() and fp.name not in keep:
+            fp.unlink()
+
+
+def build(out, jobs, full=False):
+    """Pre-render every public route into out/; post pages are only re-rendered when updated_at or their related posts changed."""
+    started = time.monotonic()
+    out = Path(out).resolve()
+    out.mkdir(parents=True, exist_ok=True)
+    manifest_path = out / '.build-manifest.json'
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}  # read even with --full: it lists what to prune
+    fingerprint = hashlib.sha1(Path(__file__).read_bytes() + json.dumps([ASSETS, BASE_URL, GA4_ID]).encode()).hexdigest()
+    previous = manifest.get('posts', {}) if manifest.get('version') == fingerprint and not full else {}
+
+    with db() as conn:
+        TAXONOMY.fresh(conn)
+        posts = {r['slug']: f"{r['updated_at']} {hashlib.sha1(repr(TAXONOMY.related(r['id'])).encode()).hexdigest()[:12]}"
+                 for r in conn.execute("SELECT id, slug, updated_at FROM posts WHERE status='published'").fetchall()}
+        listings = [('/', listing_cursors(), lambda cursor, older: render_home('', 1, cursor, older))]
+        feeds = [(None, None)]
+        for kind, table, key in (('category', 'categories', 'category_id'), ('tag', 'tags', 'tag_id')):
+            for entity in conn.execute(f"SELECT id, slug FROM {table}").fetchall():
+                feeds.append((kind, entity['slug']))
+                cursors = listing_cursors(**{key: entity['id']})
+                listings.append((f"/{kind}/{entity['slug']}/", cursors, lambda cursor, older, kind=kind, slug=entity['slug']: render_listing(kind, slug, cursor, older)))
+        sitemap_refresh(conn)
+
+    stale = [slug for slug, version in posts.items() if previous.get(slug) != version]
+    # Any post directory that is not a published slug goes, whatever the manifest says, so unpublished posts leave the CDN.
+    (out / 'post').mkdir(exist_ok=True)
+    for fp in (out / 'post').iterdir():
+        if fp.is_dir() and fp.name not in posts:
+            shutil.rmtree(fp, ignore_errors=True)
+    if stale:
+        POOL.close_all()  # never hand an open SQLite connection to forked workers
+        size = max(1, len(stale) // (jobs * 4))
+        chunks = [stale[i:i + size] for i in range(0, len(stale), size)]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=register_assets) as executor:
+            list(executor.map(export_posts, [out] * len(chunks), chunks))
+
+    pages = []
+    for base, cursors, render in listings:
+        pages += export_listing(out, base, cursors, render)
+    for kind, slug in feeds:
+        for name in FEED_TYPES:
+            rel = Path(f"{kind}/{slug}" if kind else '') / name
+            write_if_changed(out / rel, render_feed(name, kind, slug)[0].encode('utf-8'))
+            pages.append(rel.as_posix())
+    for rel in set(manifest.get('pages', [])) - set(pages):
+        (out / rel).unlink(missing_ok=True)
+        for parent in (out / rel).parents:  # drop the directories left empty, up to out/
+            if parent == out:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+    _status, about, _pid = render_public('/about', {})
+    write_if_changed(out / 'about' / 'index.html', about.encode('utf-8'))
+    write_if_changed(out / '404.html', base_layout('404', '<h1>No encontrado</h1>').encode('utf-8'))
+    write_if_changed(out / 'robots.txt', robots_txt().encode('utf-8'))
+
+    write_if_changed(out / 'sitemap.xml', gzip.decompress((SITEMAP_DIR / 'index.xml.gz').read_bytes()))
+    (out / 'sitemaps').mkdir(exist_ok=True)
+    shards = {fp.name[:-len('.gz')] for fp in SITEMAP_DIR.glob('*.xml.gz') if fp.name != 'index.xml.gz'}
+    for name in shards:
+        write_if_changed(out / 'sitemaps' / name, gzip.decompress((SITEMAP_DIR / f"{name}.gz").read_bytes()))
+    for fp in (out / 'sitemaps').iterdir():
+        if fp.name not in shards:
+            fp.unlink()
+    mirror_dir(STATIC_DIR, out / 'static', ASSETS)
+    mirror_dir(UPLOADS_DIR, out / 'uploads')
+
+    manifest_path.write_text(json.dumps({'version': fingerprint, 'posts': posts, 'pages': pages}))
+    print(f"Built {len(stale)} of {len(posts)} posts and {len(pages)} listing pages and feeds into {out} in {time.monotonic() - started:.1f}s")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('serve', help='Run the HTTP server (default)')
+    commands.add_parser('reindex', help='Rebuild the FTS5 search index from the posts table')
+    derive_cmd = commands.add_parser('derive', help='Backfill pre-computed post fields and fragments')
+    derive_cmd.add_argument('--all', action='store_true', help='rewrite every post, not only rows from an older version')
+    import_cmd = commands.add_parser('import', help='Bulk-import posts from JSONL or Markdown files with front matter (upsert on slug)')
+    import_cmd.add_argument('path', help="JSONL file ('-' for stdin), a .md file or a directory of .md files")
+    import_cmd.add_argument('--format', choices=['jsonl', 'md'], help='default: md for directories and .md files, else jsonl')
+    import_cmd.add_argument('--batch', type=int, default=500, help='posts per transaction (default: 500)')
+    export_cmd = commands.add_parser('export', help='Export posts as JSONL or as Markdown files with front matter')
+    export_cmd.add_argument('path', help="JSONL file ('-' for stdout) or a directory for Markdown files")
+    export_cmd.add_argument('--format', choices=['jsonl', 'md'], help='default: jsonl for .jsonl and -, else md')
+    export_cmd.add_argument('--status', choices=['draft', 'published'], help='only export posts with this status')
+    build_cmd = commands.add_parser('build', help='Pre-render the public site into a static directory')
+    build_cmd.add_argument('--out', default='dist', help='output directory (default: dist)')
+    build_cmd.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='render processes (default: CPU count)')
+    build_cmd.add_argument('--full', action='store_true', help='ignore the build manifest and re-render every post')
+    args = parser.parse_args()
     ensure_dirs()
     write_static()
     init_db()
-    port = int(os.getenv('PORT', '8000'))
-    print(f"Running on http://localhost:{port}")
-    ThreadingHTTPServer(('0.0.0.0', port), Handler).serve_forever()
+    if args.command == 'reindex':
+        reindex()
+    elif args.command == 'derive':
+        derive(args.all)
+    elif args.command == 'import':
+        import_content(args.path, args.format or ('md' if Path(args.path).is_dir() or args.path.endswith('.md') else 'jsonl'), max(1, args.batch))
+    elif args.command == 'export':
+        export_content(args.path, args.format or ('jsonl' if args.path == '-' or args.path.endswith('.jsonl') else 'md'), args.status)
+    elif args.command == 'build':
+        build(args.out, max(1, args.jobs), args.full)
+    else:
+        serve()
@@ -0,0 +1,340 @@
+"""HTTP benchmark for the blog server.
+
+Seeds a throwaway database through app.init_db(), serves app.Handler on an
+ephemeral port and drives concurrent load against every public route plus
+/admin/save. Results are JSON (throughput and p50/p95/p99 latency per route).
+
+    python3 bench/bench.py run --posts 2000 --out baseline.json
+    python3 bench/bench.py run --compare baseline.json
+    python3 bench/bench.py compare baseline.json current.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import app  # noqa: E402
+
+ROUTES = ["home", "search", "post", "category", "tag", "sitemap", "feed", "static", "admin_save"]
+
+SPANISH = (
+    "hoy practiqué los tonos con mi profesora y todavía confundo el segundo con el tercero cuando hablo rápido "
+    "la gramática básica del mandarín es más sencilla de lo que parece porque los verbos no se conjugan "
+    "repasé las tarjetas de vocabulario del nivel uno y anoté las palabras que más me cuestan en el cuaderno "
+    "escuchar podcasts para estudiantes me ayuda a reconocer frases completas en lugar de palabras sueltas "
+    "la cultura china tiene festivales que cambian de fecha cada año porque siguen el calendario lunar"
+).split()
+CHINESE = [
+    "我每天学习中文。", "你好，我叫安娜，我是西班牙人。", "这个汉字怎么写？", "我们明天去北京吃烤鸭。",
+    "老师说我的发音进步了很多。", "学习语言需要耐心和时间。", "今天天气很好，我们去公园散步吧。",
+]
+TOPICS = ["Tonos", "Pinyin", "Caracteres", "Vocabulario HSK", "Gramática", "Cultura", "Recursos", "Diario"]
+
+
+def paragraph(rng, words):
+    text = " ".join(rng.choice(SPANISH) for _ in range(words))
+    return f"<p>{text.capitalize()}. {rng.choice(CHINESE)} {rng.choice(CHINESE)}</p>"
+
+
+def article(rng, words):
+    parts = [f"<h1>{rng.choice(TOPICS)}</h1>"]
+    while words > 0:
+        parts.append(f"<h2>{rng.choice(TOPICS)} {rng.choice(CHINESE)}</h2>")
+        for _ in range(rng.randint(2, 4)):
+            n = rng.randint(40, 120)
+            parts.append(paragraph(rng, n))
+            words -= n
+    return "".join(parts)
+
+
+def seed(posts, tags, analytics, words, rng):
+    """Fill the (already initialised) database with synthetic published posts, tags and analytics events."""
+    now = datetime.utcnow()
+    with app.db() as conn:
+        categories = [r["id"] for r in conn.execute("SELECT id FROM categories").fetchall()]
+        conn.executemany("INSERT OR IGNORE INTO tags(name, slug) VALUES(?,?)",
+                         [(f"{TOPICS[i % len(TOPICS)]} {i}", app.slugify(f"{TOPICS[i % len(TOPICS)]} {i}")) for i in range(tags)])
+        tag_ids = [r["id"] for r in conn.execute("SELECT id FROM tags").fetchall()]
+        rows = []
+        for i in range(posts):
+            title = f"{rng.choice(TOPICS)}: lección {i} {rng.choice(CHINESE)}"
+            slug = app.slugify(f"leccion-{i}-{rng.choice(TOPICS)}")
+            content = article(rng, int(rng.lognormvariate(math.log(words), 0.5)))  # long-tailed around the median
+            when = (now - timedelta(minutes=posts - i)).isoformat()
+            rows.append((title, slug, content, app.excerpt_from(content), "published", rng.choice(categories), title, title,
+                         app.excerpt_from(content), f"{app.BASE_URL}/post/{slug}", app.reading_time_minutes(content), when, when, when))
+        conn.executemany("""INSERT INTO posts(title,slug,content,excerpt,status,category_id,featured_image_alt,meta_title,meta_description,canonical_url,read_time,created_at,updated_at,published_at)
+                            VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", rows)
+        post_ids = [r["id"] for r in conn.execute("SELECT id FROM posts").fetchall()]
+        if tag_ids:
+            conn.executemany("INSERT OR IGNORE INTO post_tags(post_id, tag_id) VALUES(?,?)",
+                             [(pid, tid) for pid in post_ids for tid in rng.sample(tag_ids, min(len(tag_ids), rng.randint(1, 4)))])
+        conn.executemany("INSERT INTO analytics(post_id, path, event_type, value, created_at) VALUES(?,?,?,?,?)",
+                         [(rng.choice(post_ids), "/", "pageview", 0, (now - timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat()) for _ in range(analytics)])
+        conn.execute("DELETE FROM analytics_hourly")
+        conn.execute("DELETE FROM analytics_daily")
+        conn.execute("INSERT INTO analytics_hourly SELECT substr(created_at, 1, 13), COALESCE(post_id, 0), event_type, COUNT(*) FROM analytics GROUP BY 1, 2, 3")
+        conn.execute("INSERT INTO analytics_daily SELECT substr(created_at, 1, 10), COALESCE(post_id, 0), event_type, COUNT(*) FROM analytics GROUP BY 1, 2, 3")
+        app.backfill_derived(conn)
+        if app.FTS_ENABLED:
+            app.fts_rebuild(conn)
+        app.sitemap_refresh(conn)
+        slugs = [r["slug"] for r in conn.execute("SELECT slug FROM posts").fetchall()]
+        category_slugs = [r["slug"] for r in conn.execute("SELECT slug FROM categories").fetchall()]
+        tag_slugs = [r["slug"] for r in conn.execute("SELECT slug FROM tags").fetchall()]
+        category_ids = categories
+    return {"slugs": slugs, "categories": category_slugs, "tags": tag_slugs, "category_ids": category_ids}
+
+
+class QuietHandler(app.Handler):
+    def log_message(self, *args):
+        pass
+
+
+class QuietBufferedHandler(app.BufferedHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_server(engine):
+    """Serves the app on an ephemeral port with the chosen engine; returns (port, stop)."""
+    if engine == "asyncio":
+        started, holder = threading.Event(), {}
+
+        def ready(server):
+            holder["server"], holder["loop"] = server, asyncio.get_running_loop()
+            started.set()
+
+        def main():
+            try:
+                asyncio.run(app.serve_async("127.0.0.1", 0, QuietBufferedHandler, ready))
+            except asyncio.CancelledError:
+                pass
+
+        threading.Thread(target=main, name="bench-server", daemon=True).start()
+        started.wait()
+        return holder["server"].sockets[0].getsockname()[1], lambda: holder["loop"].call_soon_threadsafe(holder["server"].close)
+    server = app.BoundedHTTPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server.server_address[1], lambda: (server.shutdown(), server.server_close())
+
+
+def request(conn, method, path, body=None, headers=None):
+    # Clients reuse their connection; http.client reconnects by itself when the server closed it (HTTP/1.0).
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        res = conn.getresponse()
+        res.read()
+        return res.status, res
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        raise
+
+
+def login(port):
+    status, res = request(http.client.HTTPConnection("127.0.0.1", port, timeout=30), "POST", "/admin/login", urlencode({"username": "admin", "password": "admin123"}),
+                          {"Content-Type": "application/x-www-form-urlencoded"})
+    cookie = res.getheader("Set-Cookie", "")
+    if status != 302 or "session=" not in cookie:
+        raise SystemExit(f"admin login failed ({status})")
+    return cookie.split(";", 1)[0]
+
+
+def scenario(route, data, cookie, counter):
+    """Returns a callable producing (method, path, body, headers) for one request against route."""
+    if route == "home":
+        return lambda rng: ("GET", "/", None, {})
+    if route == "search":
+        terms = ["tonos", "gramática", "pinyin", "中文", "北京", "vocabulario hsk", "profesora"]
+        return lambda rng: ("GET", f"/?q={quote(rng.choice(terms))}", None, {})
+    if route == "post":
+        return lambda rng: ("GET", f"/post/{quote(rng.choice(data['slugs']))}", None, {})
+    if route == "category":
+        return lambda rng: ("GET", f"/category/{quote(rng.choice(data['categories']))}", None, {})
+    if route == "tag":
+        return lambda rng: ("GET", f"/tag/{quote(rng.choice(data['tags']))}", None, {})
+    if route == "sitemap":
+        return lambda rng: ("GET", rng.choice(["/sitemap.xml", "/sitemaps/pages.xml", "/sitemaps/posts-0.xml"]), None, {"Accept-Encoding": "gzip"})
+    if route == "feed":
+        scopes = [""] + [f"/category/{quote(c)}" for c in data["categories"]] + [f"/tag/{quote(t)}" for t in data["tags"]]
+        return lambda rng: ("GET", f"{rng.choice(scopes)}/{rng.choice(['feed.xml', 'atom.xml', 'feed.json'])}", None, {"Accept-Encoding": "gzip"})
+    if route == "static":
+        return lambda rng: ("GET", app.asset_url(rng.choice(["style.css", "app.js"])), None, {})
+    if route == "admin_save":
+        def make(rng):
+            n = next(counter)
+            content = article(rng, 600)
+            body = urlencode({"title": f"Benchmark {n}", "slug": f"benchmark-{n}", "content": content, "status": "published",
+                              "category_id": rng.choice(data["category_ids"]), "meta_title": f"Benchmark {n}",
+                              "meta_description": app.excerpt_from(content), "featured_image_alt": "benchmark"})
+            return "POST", "/admin/save", body, {"Content-Type": "application/x-www-form-urlencoded", "Cookie": cookie}
+        return make
+    raise SystemExit(f"unknown route: {route}")
+
+
+def load(port, make, concurrency, duration, rng_seed):
+    latencies, errors, lock = [], 0, threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        nonlocal errors
+        rng = random.Random(rng_seed + i)
+        local, failed = [], 0
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make(rng)
+            started = time.perf_counter()
+            try:
+                status, _ = request(conn, method, path, body, headers)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            local.append(time.perf_counter() - started)
+            failed += status == 0 or status >= 400
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies, errors, elapsed):
+    ms = sorted(x * 1000 for x in latencies)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else None,
+        "p50_ms": round(cuts[49], 2) if ms else None,
+        "p95_ms": round(cuts[94], 2) if ms else None,
+        "p99_ms": round(cuts[98], 2) if ms else None,
+        "max_ms": round(ms[-1], 2) if ms else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="blog-bench-") as tmp:
+        # Point the app at a scratch data directory; static assets are only read.
+        app.DATA_DIR = Path(tmp) / "data"
+        app.DB_PATH = app.DATA_DIR / "blog.db"
+        app.SITEMAP_DIR = app.DATA_DIR / "sitemaps"
+        app.UPLOADS_DIR = Path(tmp) / "uploads"
+        app.ensure_dirs()
+        app.register_assets()
+        app.init_db()
+        started = time.perf_counter()
+        data = seed(args.posts, args.tags, args.analytics, args.words, rng)
+        seed_seconds = time.perf_counter() - started
+        port, stop = start_server(args.engine)
+        client = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        counter = iter(range(1, 10**9))
+        routes = {}
+        try:
+            cookie = login(port)
+            for route in args.routes.split(","):
+                make = scenario(route, data, cookie, counter)
+                for _ in range(args.warmup):
+                    request(client, *make(rng))
+                routes[route] = load(port, make, args.concurrency, args.duration, args.seed)
+                print(f"{route:<11} {routes[route]['rps']:>8} req/s  p50 {routes[route]['p50_ms']} ms  p95 {routes[route]['p95_ms']} ms  p99 {routes[route]['p99_ms']} ms",
+                      file=sys.stderr)
+        finally:
+            client.close()
+            stop()
+            app.ANALYTICS.stop()
+            app.POOL.close_all()
+    result = {
+        "meta": {
+            "revision": git_revision(), "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "fts": app.FTS_ENABLED,
+            "posts": args.posts, "tags": args.tags, "analytics": args.analytics, "words": args.words,
+            "engine": args.engine, "concurrency": args.concurrency, "duration": args.duration, "seed": args.seed, "seed_seconds": round(seed_seconds, 2),
+        },
+        "routes": routes,
+    }
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        return compare(json.loads(Path(args.compare).read_text()), result, args.tolerance)
+    return 0
+
+
+def compare(baseline, current, tolerance):
+    """Prints a per-route diff; returns 1 when p95 latency or throughput regressed beyond tolerance."""
+    regressions = []
+    print(f"{'route':<11} {'rps':>17} {'p95 ms':>19} {'p99 ms':>19}", file=sys.stderr)
+    for route, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            print(f"{route:<11} (no baseline)", file=sys.stderr)
+            continue
+        slower = before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance)
+        fewer = before["rps"] and now["rps"] < before["rps"] * (1 - tolerance)
+        if slower or fewer or now["errors"] > before["errors"]:
+            regressions.append(route)
+        print(f"{route:<11} {before['rps']:>8} → {now['rps']:<8} {before['p95_ms']:>8} → {now['p95_ms']:<8} {before['p99_ms']:>8} → {now['p99_ms']:<8}"
+              f"{'  REGRESSION' if route in regressions else ''}", file=sys.stderr)
+    if regressions:
+        print(f"Regressions (>{tolerance:.0%}): {', '.join(regressions)}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every route of the blog server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("run", help="seed a scratch database and load-test the server")
+    bench.add_argument("--posts", type=int, default=2000)
+    bench.add_argument("--tags", type=int, default=200)
+    bench.add_argument("--analytics", type=int, default=50000, help="raw analytics events to seed")
+    bench.add_argument("--words", type=int, default=750, help="median words per post")
+    bench.add_argument("--routes", default=",".join(ROUTES))
+    bench.add_argument("--engine", choices=["threading", "asyncio"], default="threading", help="server engine under test (SERVER_ENGINE)")
+    bench.add_argument("--concurrency", type=int, default=8)
+    bench.add_argument("--duration", type=float, default=5.0, help="seconds of load per route")
+    bench.add_argument("--warmup", type=int, default=20, help="requests per route before measuring")
+    bench.add_argument("--seed", type=int, default=1)
+    bench.add_argument("--out", help="write results JSON here instead of stdout")
+    bench.add_argument("--compare", help="baseline results JSON to compare against")
+    bench.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown before failing")
+    diff = commands.add_parser("compare", help="compare two saved result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+    sys.exit(compare(json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()), args.tolerance))
@@ -16,6 +16,6 @@ if(form){
   editor.addEventListener('input', suggest); suggest();
   document.getElementById('autosave')?.addEventListener('click',()=>{contentInput.value=editor.innerHTML; localStorage.setItem('draft_'+(slugInput.value||'new'), JSON.stringify(Object.fromEntries(new FormData(form)))); alert('Borrador guardado en navegador');});
   const key='draft_'+(slugInput.value||'new'); const draft=localStorage.getItem(key); if(draft && !form.querySelector('input[name="id"]').value){const d=JSON.parse(draft); for(const [k,v] of Object.entries(d)){const el=form.querySelector(`[name="${k}"]`); if(el) el.value=v;} if(d.content) editor.innerHTML=d.content;}
-  featured?.addEventListener('change', async (e)=>{const file=e.target.files[0]; if(!file) return; const img=await createImageBitmap(file); const canvas=document.createElement('canvas'); canvas.width=img.width; canvas.height=img.height; const ctx=canvas.getContext('2d'); ctx.drawImage(img,0,0); canvas.toBlob(async(blob)=>{const seoName=(slugInput.value||titleInput.value||'image').toLowerCase().replace(/\s+/g,'-')+'.webp'; const res=await fetch('/admin/upload-image',{method:'POST',headers:{'X-File-Name':seoName},body:blob}); const j=await res.json(); hiddenImage.value=j.filename; const alt=form.querySelector('input[name="featured_image_alt"]'); if(!alt.value){alt.value='Imagen destacada: '+(titleInput.value||'aprendizaje de chino');} }, 'image/webp', 0.8);
+  featured?.addEventListener('change', async (e)=>{const file=e.target.files[0]; if(!file) return; const img=await createImageBitmap(file); const canvas=document.createElement('canvas'); canvas.width=img.width; canvas.height=img.height; const ctx=canvas.getContext('2d'); ctx.drawImage(img,0,0); canvas.toBlob(async(blob)=>{const seoName=(slugInput.value||titleInput.value||'image').toLowerCase().replace(/\s+/g,'-')+'.webp'; const res=await fetch('/admin/upload-image',{method:'POST',headers:{'X-File-Name':seoName},body:blob}); const j=await res.json(); if(!res.ok){alert(j.error||'No se pudo subir la imagen'); return;} hiddenImage.value=j.filename; const alt=form.querySelector('input[name="featured_image_alt"]'); if(!alt.value){alt.value='Imagen destacada: '+(titleInput.value||'aprendizaje de chino');} }, 'image/webp', 0.8);
   });
 }